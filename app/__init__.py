@@ -1,6 +1,11 @@
 from flask import Flask
 from config import Config
 from app.services.firebase_service import init_firebase
+from app.services.static_assets import init_assets
+from app.services.compression import init_compression
+from app.services.request_memo import init_request_memo
+from app.services.instrumentation import init_instrumentation
+from app.services.metrics import init_metrics
 
 def create_app():
     app = Flask(__name__)
@@ -9,6 +14,21 @@ def create_app():
     # Initialize Firebase
     init_firebase(app)
 
+    # Fingerprinted static asset URLs (asset_url in templates)
+    init_assets(app)
+
+    # gzip/brotli for pages and JSON (streamed responses are skipped)
+    init_compression(app)
+
+    # Per-request memo of Firestore reads (logs duplicates saved)
+    init_request_memo(app)
+
+    # Backend call counts per request (Server-Timing header + log line)
+    init_instrumentation(app)
+
+    # Prometheus /metrics (per-endpoint latency, in-flight, backend reads, cache hits)
+    init_metrics(app)
+
     # Register Blueprints
     from app.routes.auth import auth_bp
     from app.routes.main import main_bp
@@ -26,4 +46,8 @@ def create_app():
     app.register_blueprint(routes_bp)
     app.register_blueprint(api_bp)
 
+    # Re-queue background jobs lost with a previous process (handlers are registered by now)
+    from app.services.job_service import init_jobs
+    init_jobs(app)
+
     return app
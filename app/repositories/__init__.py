@@ -0,0 +1,154 @@
+from app.services.firebase_service import get_db
+
+# Data-access layer for organization data. Every org-scoped collection path is
+# built here, so route modules and services never spell out
+# organizations/{uid}/... themselves. Repositories sit on top of whatever
+# get_db() returns: the Firestore client, or the in-memory client from
+# app.repositories.memory when DATA_BACKEND=memory (same query semantics, no
+# Firebase needed).
+
+
+def org_ref(uid):
+    return get_db().collection('organizations').document(uid)
+
+
+class Repository:
+    collection = None
+
+    def __init__(self, uid):
+        self.uid = uid
+
+    @property
+    def ref(self):
+        """CollectionReference, for building queries."""
+        return org_ref(self.uid).collection(self.collection)
+
+    def doc(self, doc_id=None):
+        """DocumentReference for doc_id, or a new auto-ID reference."""
+        return self.ref.document(doc_id) if doc_id else self.ref.document()
+
+
+class SubcollectionRepository(Repository):
+    """A collection under one parent document, e.g. a student's payments."""
+    parent = None
+
+    def __init__(self, uid, parent_id):
+        super().__init__(uid)
+        self.parent_id = parent_id
+
+    @property
+    def ref(self):
+        return org_ref(self.uid).collection(self.parent).document(self.parent_id).collection(self.collection)
+
+
+class StudentRepository(Repository):
+    collection = 'students'
+
+
+class BusRepository(Repository):
+    collection = 'buses'
+
+
+class DriverRepository(Repository):
+    collection = 'drivers'
+
+
+class RouteRepository(Repository):
+    collection = 'routes'
+
+
+class StopRepository(Repository):
+    collection = 'stops'
+
+
+class JobRepository(Repository):
+    collection = 'jobs'
+
+
+class PaymentRepository(SubcollectionRepository):
+    parent = 'students'
+    collection = 'payments'
+
+
+class AttendanceRepository(SubcollectionRepository):
+    # Per-trip records written by the bus devices
+    parent = 'students'
+    collection = 'attendance_record'
+
+
+class DailyAttendanceRepository(SubcollectionRepository):
+    # Legacy per-day records (morning/evening status)
+    parent = 'students'
+    collection = 'attendance'
+
+
+class TripRepository(SubcollectionRepository):
+    # trip_history lives under both buses and drivers
+    collection = 'trip_history'
+
+    def __init__(self, uid, parent, parent_id):
+        super().__init__(uid, parent_id)
+        self.parent = parent
+
+
+COLLECTIONS = {
+    'students': StudentRepository,
+    'buses': BusRepository,
+    'drivers': DriverRepository,
+    'routes': RouteRepository,
+    'stops': StopRepository,
+    'jobs': JobRepository
+}
+
+
+def for_collection(uid, collection):
+    return COLLECTIONS[collection](uid)
+
+
+def students(uid):
+    return StudentRepository(uid)
+
+
+def buses(uid):
+    return BusRepository(uid)
+
+
+def drivers(uid):
+    return DriverRepository(uid)
+
+
+def routes(uid):
+    return RouteRepository(uid)
+
+
+def stops(uid):
+    return StopRepository(uid)
+
+
+def jobs(uid):
+    return JobRepository(uid)
+
+
+def all_jobs():
+    """Collection group query over the jobs of every org."""
+    return get_db().collection_group(JobRepository.collection)
+
+
+def payments(uid, student_id):
+    return PaymentRepository(uid, student_id)
+
+
+def attendance(uid, student_id):
+    return AttendanceRepository(uid, student_id)
+
+
+def daily_attendance(uid, student_id):
+    return DailyAttendanceRepository(uid, student_id)
+
+
+def bus_trips(uid, bus_id):
+    return TripRepository(uid, 'buses', bus_id)
+
+
+def driver_trips(uid, driver_id):
+    return TripRepository(uid, 'drivers', driver_id)
@@ -0,0 +1,707 @@
+import copy
+import functools
+import queue
+import threading
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from google.api_core import exceptions
+from google.cloud.firestore_v1 import transforms
+from google.cloud.firestore_v1.base_aggregation import AggregationResult
+from google.cloud.firestore_v1.watch import ChangeType, DocumentChange
+
+# In-memory stand-in for the Firestore client, covering the API this app uses:
+# collection/document references, where/order_by/limit/start_after/select
+# queries, count(), get_all, batches, bulk writers, @firestore.transactional
+# transactions, on_snapshot listeners and the write transforms
+# (SERVER_TIMESTAMP, Increment, ArrayUnion, ...). Query semantics follow
+# Firestore: typed value ordering, documents missing an order_by/inequality
+# field are excluded, and results are always ordered by document ID last.
+# Selected with DATA_BACKEND=memory for offline load tests and profiling.
+_MISSING = object()
+
+
+# ---------------------------------------------------------------- values
+
+def _type_rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    if isinstance(value, bytes):
+        return 5
+    if isinstance(value, MemoryDocumentReference):
+        return 6
+    if isinstance(value, (list, tuple)):
+        return 8
+    if isinstance(value, dict):
+        return 9
+    return 7  # GeoPoint and anything else
+
+
+def _timestamp(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _compare(a, b):
+    ra, rb = _type_rank(a), _type_rank(b)
+    if ra != rb:
+        return -1 if ra < rb else 1
+    if ra == 0:
+        return 0
+    if ra == 3:
+        a, b = _timestamp(a), _timestamp(b)
+    elif ra == 6:
+        a, b = a.path, b.path
+    elif ra == 7:
+        a, b = (a.latitude, a.longitude), (b.latitude, b.longitude)
+    elif ra == 8:
+        for x, y in zip(a, b):
+            c = _compare(x, y)
+            if c:
+                return c
+        a, b = len(a), len(b)
+    elif ra == 9:
+        return _compare(sorted(a.items()), sorted(b.items()))
+    return (a > b) - (a < b)
+
+
+def _lookup_key(value):
+    # Hashable key with _compare's equality for scalars (1 == 1.0, tz-aware timestamps), else None
+    rank = _type_rank(value)
+    if rank in (0, 1, 2, 4, 5):
+        return rank, value
+    if rank == 3:
+        return rank, _timestamp(value)
+    return None
+
+
+def _get_field(data, field_path):
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _set_field(data, field_path, value):
+    parts = field_path.split('.')
+    for part in parts[:-1]:
+        child = data.get(part)
+        if not isinstance(child, dict):
+            child = data[part] = {}
+        data = child
+    data[parts[-1]] = value
+
+
+def _delete_field(data, field_path):
+    parts = field_path.split('.')
+    for part in parts[:-1]:
+        data = data.get(part)
+        if not isinstance(data, dict):
+            return
+    data.pop(parts[-1], None)
+
+
+def _apply_value(data, field_path, value, now):
+    """Write one field, resolving sentinels and transforms against the current value."""
+    if value is transforms.DELETE_FIELD:
+        _delete_field(data, field_path)
+        return
+    current = _get_field(data, field_path)
+    if value is transforms.SERVER_TIMESTAMP:
+        value = now
+    elif isinstance(value, transforms.Increment):
+        base = current if isinstance(current, (int, float)) and not isinstance(current, bool) else 0
+        value = base + value.value
+    elif isinstance(value, transforms.Maximum):
+        value = value.value if not isinstance(current, (int, float)) else max(current, value.value)
+    elif isinstance(value, transforms.Minimum):
+        value = value.value if not isinstance(current, (int, float)) else min(current, value.value)
+    elif isinstance(value, transforms.ArrayUnion):
+        base = list(current) if isinstance(current, list) else []
+        value = base + [v for v in value.values if all(_compare(v, b) for b in base)]
+    elif isinstance(value, transforms.ArrayRemove):
+        base = list(current) if isinstance(current, list) else []
+        value = [b for b in base if all(_compare(v, b) for v in value.values)]
+    elif isinstance(value, dict):
+        nested = {}
+        for k, v in value.items():
+            _apply_value(nested, k, v, now)
+        value = nested
+    else:
+        value = copy.deepcopy(value)
+    _set_field(data, field_path, value)
+
+
+def _merge(data, updates, now):
+    for key, value in updates.items():
+        if isinstance(value, dict) and isinstance(data.get(key), dict):
+            _merge(data[key], value, now)
+        else:
+            _apply_value(data, key, value, now)
+
+
+class _WriteResult:
+    def __init__(self, update_time):
+        self.update_time = update_time
+
+
+# ---------------------------------------------------------------- snapshots and references
+
+class MemoryDocumentSnapshot:
+    def __init__(self, reference, data, read_time):
+        self.reference = reference
+        self._data = data
+        self.read_time = read_time
+
+    @property
+    def id(self):
+        return self.reference.id
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        value = _get_field(self._data or {}, field_path)
+        if value is _MISSING:
+            raise KeyError(field_path)
+        return copy.deepcopy(value)
+
+
+class MemoryDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = tuple(path)
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and other._path == self._path
+
+    def __hash__(self):
+        return hash(self._path)
+
+    @property
+    def id(self):
+        return self._path[-1]
+
+    @property
+    def path(self):
+        return '/'.join(self._path)
+
+    @property
+    def parent(self):
+        return MemoryCollectionReference(self._client, self._path[:-1])
+
+    def collection(self, collection_id):
+        return MemoryCollectionReference(self._client, self._path + (collection_id,))
+
+    def get(self, field_paths=None, transaction=None):
+        return self._client._snapshot(self, field_paths)
+
+    def create(self, document_data):
+        return self._client._write([('create', self, document_data, None)])[0]
+
+    def set(self, document_data, merge=False):
+        return self._client._write([('set', self, document_data, merge)])[0]
+
+    def update(self, field_updates):
+        return self._client._write([('update', self, field_updates, None)])[0]
+
+    def delete(self):
+        return self._client._write([('delete', self, None, None)])[0]
+
+
+class _Filter:
+    def __init__(self, field_path, op, value):
+        self.field_path = field_path
+        self.op = op
+        self.value = value
+        # 'in' / 'not-in' over scalars: match with one set lookup instead of comparing every value
+        self.lookup = None
+        if op in ('in', 'not-in'):
+            keys = [_lookup_key(v) for v in value]
+            if None not in keys:
+                self.lookup = set(keys)
+
+    def matches(self, doc_id, data):
+        actual = doc_id if self.field_path == '__name__' else _get_field(data, self.field_path)
+        if self.op == 'not-in':
+            if actual is _MISSING or actual is None:
+                return False
+            if self.lookup is not None:
+                return _lookup_key(actual) not in self.lookup
+            return all(_compare(actual, v) for v in self.value)
+        if actual is _MISSING:
+            return False
+        op, value = self.op, self.value
+        if self.field_path == '__name__' and isinstance(value, MemoryDocumentReference):
+            value = value.id
+        if op == '==':
+            return _compare(actual, value) == 0
+        if op == '!=':
+            return actual is not None and _compare(actual, value) != 0
+        if op == 'in':
+            if self.lookup is not None:
+                key = _lookup_key(actual)
+                if key is not None:
+                    return key in self.lookup
+            return any(_compare(actual, v) == 0 for v in value)
+        if op == 'array_contains':
+            return isinstance(actual, list) and any(_compare(a, value) == 0 for a in actual)
+        if op == 'array_contains_any':
+            return isinstance(actual, list) and any(_compare(a, v) == 0 for a in actual for v in value)
+        if _type_rank(actual) != _type_rank(value):
+            return False
+        c = _compare(actual, value)
+        return {'<': c < 0, '<=': c <= 0, '>': c > 0, '>=': c >= 0}[op]
+
+
+INEQUALITY_OPS = ('<', '<=', '>', '>=', '!=', 'not-in')
+
+
+class MemoryQuery:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, parent, filters=(), orders=(), limit=None, offset=0, cursor=None, projection=None):
+        self._parent = parent
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._offset = offset
+        self._cursor = cursor  # (values or snapshot, before)
+        self._projection = projection
+
+    def _copy(self, **changes):
+        fields = dict(filters=self._filters, orders=self._orders, limit=self._limit, offset=self._offset,
+                      cursor=self._cursor, projection=self._projection)
+        fields.update(changes)
+        return MemoryQuery(self._parent, **fields)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        op_string = op_string.replace('-', '_') if op_string.startswith('array') else op_string
+        return self._copy(filters=self._filters + (_Filter(field_path, op_string, value),))
+
+    def order_by(self, field_path, direction=ASCENDING):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def offset(self, num_to_skip):
+        return self._copy(offset=num_to_skip)
+
+    def select(self, field_paths):
+        return self._copy(projection=list(field_paths))
+
+    def start_after(self, document_fields_or_snapshot):
+        return self._copy(cursor=(document_fields_or_snapshot, False))
+
+    def start_at(self, document_fields_or_snapshot):
+        return self._copy(cursor=(document_fields_or_snapshot, True))
+
+    def _effective_orders(self):
+        orders = list(self._orders)
+        ordered = {f for f, _ in orders}
+        # An inequality filter implies ordering by its field first
+        for flt in self._filters:
+            if flt.op in INEQUALITY_OPS and flt.field_path not in ordered and flt.field_path != '__name__':
+                orders.insert(0, (flt.field_path, self.ASCENDING))
+                ordered.add(flt.field_path)
+        if '__name__' not in ordered:
+            orders.append(('__name__', orders[-1][1] if orders else self.ASCENDING))
+        return orders
+
+    def _rows(self):
+        # Matching (sort values, doc_id, data) rows in query order, after cursor/offset/limit
+        orders = self._effective_orders()
+        rows = []
+        for doc_id, data in self._parent._items():
+            if not all(f.matches(doc_id, data) for f in self._filters):
+                continue
+            values = []
+            for field, _ in orders:
+                value = doc_id if field == '__name__' else _get_field(data, field)
+                if value is _MISSING:
+                    break
+                values.append(value)
+            else:
+                rows.append((values, doc_id, data))
+
+        def cmp_rows(a, b):
+            for (_, direction), x, y in zip(orders, a[0], b[0]):
+                c = _compare(x, y)
+                if c:
+                    return -c if direction == self.DESCENDING else c
+            return 0
+
+        rows.sort(key=functools.cmp_to_key(cmp_rows))
+
+        if self._cursor is not None:
+            position, inclusive = self._cursor
+            if isinstance(position, MemoryDocumentSnapshot):
+                snapshot_data = position._data or {}
+                cursor = [position.id if f == '__name__' else _get_field(snapshot_data, f) for f, _ in orders]
+            else:
+                cursor = [position.get(f, _MISSING) for f, _ in orders]
+                if cursor and cursor[-1] is not _MISSING and orders[-1][0] == '__name__':
+                    cursor[-1] = str(cursor[-1]).rsplit('/', 1)[-1]
+            cursor = [v for v in cursor if v is not _MISSING]
+            keep = []
+            for row in rows:
+                c = cmp_rows((row[0][:len(cursor)],), (cursor,))
+                if c > 0 or (inclusive and c == 0):
+                    keep.append(row)
+            rows = keep
+
+        rows = rows[self._offset:]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return rows
+
+    def _run(self):
+        client, parent = self._parent._client, self._parent
+        return [client._make_snapshot(parent.document(doc_id), data, self._projection) for _, doc_id, data in self._rows()]
+
+    def stream(self, transaction=None):
+        with self._parent._client._lock:
+            snapshots = self._run()
+        return iter(snapshots)
+
+    def get(self, transaction=None):
+        return list(self.stream(transaction=transaction))
+
+    def count(self, alias=None):
+        return MemoryAggregationQuery(self, alias or 'field_1')
+
+    def on_snapshot(self, callback):
+        return MemoryWatch(self, callback)
+
+
+class MemoryCollectionReference(MemoryQuery):
+    def __init__(self, client, path):
+        self._client = client
+        self._path = tuple(path)
+        super().__init__(self)
+
+    @property
+    def id(self):
+        return self._path[-1]
+
+    @property
+    def parent(self):
+        return MemoryDocumentReference(self._client, self._path[:-1]) if len(self._path) > 1 else None
+
+    def document(self, document_id=None):
+        return MemoryDocumentReference(self._client, self._path + (document_id or uuid.uuid4().hex[:20],))
+
+    def _items(self):
+        return self._client._collection_items(self._path)
+
+    def add(self, document_data, document_id=None):
+        ref = self.document(document_id)
+        result = ref.create(document_data)
+        return result.update_time, ref
+
+    def list_documents(self):
+        with self._client._lock:
+            return [self.document(doc_id) for doc_id, _ in self._client._collection_items(self._path)]
+
+
+class MemoryCollectionGroup(MemoryQuery):
+    # Every collection with this ID at any depth; rows are keyed by full document path
+    def __init__(self, client, collection_id):
+        self._client = client
+        self._collection_id = collection_id
+        super().__init__(self)
+
+    def document(self, document_path):
+        return MemoryDocumentReference(self._client, document_path.split('/'))
+
+    def _items(self):
+        return [('/'.join(path + (doc_id,)), data)
+                for path, docs in self._client._collections.items() if path[-1] == self._collection_id
+                for doc_id, data in docs.items()]
+
+
+class MemoryAggregationQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias
+
+    def get(self, transaction=None):
+        with self._query._parent._client._lock:
+            count = len(self._query._rows())
+        return [[AggregationResult(alias=self._alias, value=count)]]
+
+
+class MemoryWatch:
+    """on_snapshot listener: the callback runs on its own thread, like the real client."""
+
+    def __init__(self, query, callback):
+        self._query = query
+        self._callback = callback
+        self._events = queue.Queue()
+        self._docs = {}
+        self._client = query._parent._client
+        self._client._add_watch(self)
+        self._thread = threading.Thread(target=self._deliver, name='memory-watch', daemon=True)
+        self._thread.start()
+        self.notify()
+
+    def notify(self):
+        self._events.put(True)
+
+    def _deliver(self):
+        while self._events.get():
+            snapshots = self._query.get()
+            current = {s.id: s for s in snapshots}
+            changes = []
+            for index, snap in enumerate(snapshots):
+                old = self._docs.get(snap.id)
+                if old is None:
+                    changes.append(DocumentChange(ChangeType.ADDED, snap, -1, index))
+                elif old._data != snap._data:
+                    changes.append(DocumentChange(ChangeType.MODIFIED, snap, index, index))
+            for doc_id, snap in self._docs.items():
+                if doc_id not in current:
+                    changes.append(DocumentChange(ChangeType.REMOVED, snap, -1, -1))
+            self._docs = current
+            if changes or not hasattr(self, '_delivered'):
+                self._delivered = True
+                try:
+                    self._callback(snapshots, changes, datetime.now(timezone.utc))
+                except Exception as e:
+                    print(f"Memory watch callback error: {e}")
+
+    def unsubscribe(self):
+        self._client._remove_watch(self)
+        self._events.put(False)
+
+
+# ---------------------------------------------------------------- writes
+
+class MemoryWriteBatch:
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def create(self, reference, document_data):
+        self._writes.append(('create', reference, document_data, None))
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(('set', reference, document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._writes.append(('update', reference, field_updates, None))
+
+    def delete(self, reference):
+        self._writes.append(('delete', reference, None, None))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        return self._client._write(writes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+
+
+class MemoryBulkWriter(MemoryWriteBatch):
+    # Writes are applied on flush/close (the real BulkWriter sends them in the
+    # background). A failed write goes to the on_write_error handler, which
+    # returns True to retry; like the real one, the default handler retries a
+    # few times and then drops the write without raising.
+    def __init__(self, client):
+        super().__init__(client)
+        self._on_write_error = lambda failure, writer: failure.attempts < 10
+
+    def on_write_error(self, callback):
+        self._on_write_error = callback
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        for write in writes:
+            attempts = 0
+            while True:
+                attempts += 1
+                try:
+                    self._client._write([write])
+                    break
+                except exceptions.GoogleAPICallError as e:
+                    code = e.grpc_status_code.value[0] if e.grpc_status_code else None
+                    failure = SimpleNamespace(operation=SimpleNamespace(reference=write[1]), code=code,
+                                              message=e.message, attempts=attempts)
+                    if not self._on_write_error(failure, self):
+                        break
+
+    def flush(self):
+        self.commit()
+
+    def close(self):
+        self.commit()
+
+
+class MemoryTransaction(MemoryWriteBatch):
+    """Serializable transaction: holds the store lock from begin to commit/rollback."""
+
+    def __init__(self, client, max_attempts=5, read_only=False):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = read_only
+        self._id = None
+
+    def _clean_up(self):
+        self._writes = []
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._client._lock.acquire()
+        self._id = uuid.uuid4().bytes
+
+    def _release(self):
+        if self._id is not None:
+            self._id = None
+            self._client._lock.release()
+
+    def _commit(self):
+        try:
+            writes, self._writes = self._writes, []
+            return self._client._write(writes)
+        finally:
+            self._release()
+
+    def _rollback(self):
+        self._writes = []
+        self._release()
+
+    def get(self, ref_or_query, **kwargs):
+        if isinstance(ref_or_query, MemoryDocumentReference):
+            return iter([ref_or_query.get(transaction=self)])
+        return ref_or_query.stream(transaction=self)
+
+    def get_all(self, references, **kwargs):
+        return self._client.get_all(references, transaction=self)
+
+
+# ---------------------------------------------------------------- client
+
+class MemoryClient:
+    def __init__(self):
+        self._collections = {}  # collection path tuple -> {doc_id: data}
+        self._lock = threading.RLock()
+        self._watches = []
+
+    def collection(self, *collection_path):
+        return MemoryCollectionReference(self, collection_path)
+
+    def document(self, *document_path):
+        if len(document_path) == 1:
+            document_path = document_path[0].split('/')
+        return MemoryDocumentReference(self, document_path)
+
+    def get_all(self, references, field_paths=None, transaction=None):
+        with self._lock:
+            snapshots = [self._snapshot(ref, field_paths) for ref in references]
+        return iter(snapshots)
+
+    def collection_group(self, collection_id):
+        return MemoryCollectionGroup(self, collection_id)
+
+    def batch(self):
+        return MemoryWriteBatch(self)
+
+    def bulk_writer(self, **kwargs):
+        return MemoryBulkWriter(self)
+
+    def transaction(self, max_attempts=5, read_only=False):
+        return MemoryTransaction(self, max_attempts=max_attempts, read_only=read_only)
+
+    def reset(self):
+        with self._lock:
+            self._collections.clear()
+
+    # -- internals
+
+    def _collection_items(self, path):
+        return list(self._collections.get(tuple(path), {}).items())
+
+    def _make_snapshot(self, ref, data, field_paths=None):
+        if data is not None and field_paths is not None:
+            projected = {}
+            for field in field_paths:
+                value = _get_field(data, field)
+                if value is not _MISSING:
+                    _set_field(projected, field, value)
+            data = projected
+        # to_dict()/get() copy on the way out; stored documents are never mutated in place
+        return MemoryDocumentSnapshot(ref, data, datetime.now(timezone.utc))
+
+    def _snapshot(self, ref, field_paths=None):
+        with self._lock:
+            data = self._collections.get(ref._path[:-1], {}).get(ref.id)
+            return self._make_snapshot(ref, data, field_paths)
+
+    def _write(self, writes):
+        """Apply writes atomically; every write is validated before any is applied."""
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for op, ref, _, _ in writes:
+                exists = ref.id in self._collections.get(ref._path[:-1], {})
+                if op == 'create' and exists:
+                    raise exceptions.AlreadyExists(f'Document already exists: {ref.path}')
+                if op == 'update' and not exists:
+                    raise exceptions.NotFound(f'No document to update: {ref.path}')
+            for op, ref, data, merge in writes:
+                docs = self._collections.setdefault(ref._path[:-1], {})
+                if op == 'delete':
+                    docs.pop(ref.id, None)
+                    continue
+                # Stored dicts are replaced, never changed in place, so snapshots can share them
+                if op == 'update':
+                    doc = copy.deepcopy(docs[ref.id])
+                    for field_path, value in data.items():
+                        _apply_value(doc, field_path, value, now)
+                    docs[ref.id] = doc
+                elif op == 'set' and merge:
+                    doc = copy.deepcopy(docs.get(ref.id, {}))
+                    _merge(doc, data, now)
+                    docs[ref.id] = doc
+                else:
+                    doc = {}
+                    for field, value in data.items():
+                        _apply_value(doc, field, value, now)
+                    docs[ref.id] = doc
+            touched = {ref._path[:-1] for _, ref, _, _ in writes}
+            watches = [w for w in self._watches if w._query._parent._path in touched]
+        for watch in watches:
+            watch.notify()
+        return [_WriteResult(now) for _ in writes]
+
+    def _add_watch(self, watch):
+        with self._lock:
+            self._watches.append(watch)
+
+    def _remove_watch(self, watch):
+        with self._lock:
+            if watch in self._watches:
+                self._watches.remove(watch)
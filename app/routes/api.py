@@ -1,39 +1,21 @@
-from flask import Blueprint, request, session, jsonify
-from app.services.firebase_service import get_db, get_bucket, get_db_rtdb
+from flask import Blueprint, request, session, jsonify, Response, current_app, stream_with_context
+from app.services.firebase_service import get_db_rtdb, normalize_phone
+from app import repositories
+from app.services import cache_service, live_trips_service, search_service, seat_service, fee_reset_service, job_service, student_service, export_service, photo_service, request_memo
 from firebase_admin import auth, firestore
-import uuid
+import json
+import queue
+import threading
 import time
 from datetime import datetime
 
 api_bp = Blueprint('api', __name__)
 
-def upload_file(file, folder):
-    if not file:
-        return None
-    try:
-        bucket = get_bucket()
-        filename = f"{folder}/{uuid.uuid4()}_{file.filename}"
-        blob = bucket.blob(filename)
-        blob.upload_from_file(file, content_type=file.content_type)
-        blob.make_public()
-        return blob.public_url
-    except Exception as e:
-        print(f"Error uploading file: {e}")
-        return None
-
 def create_firebase_user(phone_number, uid):
     try:
-        phone_number = str(phone_number).replace(" ", "").replace("-", "")
-
-        # Indian number handling
-        if len(phone_number) == 11 and phone_number.startswith("0"):
-            phone_number = phone_number[1:]
-
-        if len(phone_number) == 10:
-            phone_number = "+91" + phone_number
-
-        if not phone_number.startswith("+"):
-            return None, "Invalid phone number format"
+        phone_number, error = normalize_phone(phone_number)
+        if error:
+            return None, error
 
         try:
             user = auth.create_user(
@@ -51,6 +33,32 @@ def create_firebase_user(phone_number, uid):
     except Exception as e:
         return None, str(e)
 
+@job_service.register('auth_delete')
+def delete_firebase_user(job):
+    # Background job: remove a student's/driver's login after their record is deleted
+    auth_uid = job.params['auth_uid']
+    collection = job.params.get('collection')
+    record_id = job.params.get('record_id', auth_uid)
+
+    # The job may run long after it was queued: if the record was re-created
+    # meanwhile (same roll/license number), its login is in use again
+    for name in ([collection] if collection else ['students', 'drivers']):
+        if repositories.for_collection(job.uid, name).doc(record_id).get().exists:
+            print(f"Auth delete skipped, {name}/{record_id} exists again (uid: {auth_uid})")
+            return {'auth_uid': auth_uid, 'skipped': True}
+    if collection != 'drivers':
+        in_use = repositories.students(job.uid).ref.where('auth_uid', '==', auth_uid).limit(1).get()
+        if in_use:
+            print(f"Auth delete skipped, uid still used by student {in_use[0].id} (uid: {auth_uid})")
+            return {'auth_uid': auth_uid, 'skipped': True}
+
+    try:
+        auth.delete_user(auth_uid)
+        print(f"Auth deleted for uid: {auth_uid}")
+    except auth.UserNotFoundError:
+        print(f"Auth user already gone (uid: {auth_uid})")
+    return {'auth_uid': auth_uid}
+
 
 @api_bp.route('/api/generate_student_id', methods=['GET'])
 def api_generate_student_id():
@@ -58,9 +66,8 @@ def api_generate_student_id():
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
     try:
         uid = session['uid']
-        db = get_db()
         # Generate a new ID references
-        ref = db.collection('organizations').document(uid).collection('students').document()
+        ref = repositories.students(uid).doc()
         return jsonify({'status': 'success', 'student_id': ref.id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -103,6 +110,81 @@ def api_rfid_status():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+def wait_for_rfid_write(uid, roll_number, timeout):
+    # Hold one RTDB stream open until the writer reports success/error for this roll number
+    ref = get_db_rtdb().reference(f'organizations/{uid}/rfid_write')
+    state = {}
+    done = threading.Event()
+
+    def on_event(event):
+        path = event.path.strip('/')
+        if not path:
+            if event.event_type == 'patch':
+                state.update(event.data or {})
+            else:
+                state.clear()
+                state.update(event.data or {})
+        elif '/' not in path:
+            if event.data is None:
+                state.pop(path, None)
+            else:
+                state[path] = event.data
+        else:
+            state.clear()
+            state.update(ref.get() or {})
+
+        status = state.get('status')
+        if status == 'error' or (status == 'success' and str(state.get('student_id')) == str(roll_number)):
+            done.set()
+
+    listener = ref.listen(on_event)
+    try:
+        done.wait(timeout)
+    finally:
+        listener.close()
+    return dict(state)
+
+@api_bp.route('/api/rfid/wait', methods=['GET'])
+def api_rfid_wait():
+    if 'user' not in session or 'uid' not in session:
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    try:
+        uid = session['uid']
+        roll_number = request.args.get('roll_number', '')
+        try:
+            timeout = min(float(request.args.get('timeout', 30)), 30)
+        except ValueError:
+            timeout = 30
+
+        data = wait_for_rfid_write(uid, roll_number, timeout)
+        if not data:
+            return jsonify({'status': 'unknown'})
+
+        return jsonify(data)
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@api_bp.route('/api/students/search', methods=['GET'])
+def api_search_students():
+    if 'user' not in session or 'uid' not in session:
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    try:
+        uid = session['uid']
+        q = request.args.get('q', '').strip().lower()
+        try:
+            limit = max(1, min(int(request.args.get('limit', 10)), 50))
+        except ValueError:
+            limit = 10
+        if not q:
+            return jsonify({'status': 'success', 'students': []})
+
+        results = search_service.search(uid, q)
+        # Type-ahead: prefix matches on name or roll number rank first
+        results.sort(key=lambda e: not (str(e['full_name']).lower().startswith(q) or str(e['roll_number']).lower().startswith(q)))
+        return jsonify({'status': 'success', 'students': results[:limit]})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @api_bp.route('/api/add_student', methods=['POST'])
 def api_add_student():
     if 'uid' not in session:
@@ -110,17 +192,15 @@ def api_add_student():
 
     data = request.form.to_dict() if not request.is_json else request.get_json()
     uid = session['uid']
-    db = get_db()
 
     roll_number = str(data.get('roll_number', '')).strip()
-    parent_phone = data.get('parent_phone')
     student_phone = data.get('student_phone')
 
     if not roll_number or not student_phone:
         return jsonify({'status': 'error', 'message': 'Roll number & student phone required'}), 400
 
     # 🔍 Check Organization Settings for Payment Rule
-    org_ref = db.collection('organizations').document(uid)
+    org_ref = repositories.org_ref(uid)
     org_doc = org_ref.get()
     fee_details = ''
     if org_doc.exists:
@@ -135,91 +215,77 @@ def api_add_student():
         return jsonify({'status': 'error', 'message': error}), 400
 
     # Prevent overwrite
-    student_ref = db.collection('organizations') \
-        .document(uid) \
-        .collection('students') \
-        .document(roll_number)
+    student_ref = repositories.students(uid).doc(roll_number)
 
     if student_ref.get().exists:
         return jsonify({'status': 'error', 'message': 'Student already exists'}), 400
 
-    # 📷 Photo Upload
-    profile_photo_url = None
-    if 'student_photo' in request.files:
-        file = request.files['student_photo']
-        if file.filename:
-            profile_photo_url = upload_file(file, f"students/{uid}")
-
     try:
         fee_amount = float(data.get('fee_amount', 0))
     except ValueError:
         fee_amount = 0
 
-    # 🚌 Bus Assignment Logic
+    # 🚌 Bus Assignment: bus fields are filled in by seat_service when a seat is reserved
     bus_number_input = data.get('bus_number', '')
-    bus_id_assigned = ''
-    bus_number_assigned = ''
-
-    if bus_number_input:
-        buses_ref = db.collection('organizations').document(uid).collection('buses')
-        # Query by bus_number
-        query = buses_ref.where('bus_number', '==', bus_number_input).limit(1)
-        results = query.stream()
-        bus_doc = None
-        for doc in results:
-            bus_doc = doc
-            break
-        
-        if bus_doc:
-            b_data = bus_doc.to_dict()
-            # Check capacity
-            avail_seats = int(b_data.get('avail_seats', 0))
-            if avail_seats > 0:
-                bus_id_assigned = bus_doc.id
-                bus_number_assigned = bus_number_input
-                # Decrement seats
-                bus_doc.reference.update({'avail_seats': avail_seats - 1})
-                
-                # POPULATE ROUTE DETAILS FROM BUS
-                data['route_name'] = b_data.get('route', '') # Bus usually stores route name in 'route'
-                data['route_id'] = b_data.get('route_id', '')
-                
-            else:
-                return jsonify({'status': 'error', 'message': f'Bus {bus_number_input} is full!'}), 400
-        else:
-             return jsonify({'status': 'error', 'message': f'Bus {bus_number_input} not found!'}), 400
 
-    student_data = {
-        'full_name': data.get('full_name', ''),
-        'roll_number': roll_number,
-        'auth_uid': roll_number,           # 🔥 SAME
-        'parent_name': data.get('parent_name', ''),
-        'parent_phone': parent_phone,
-        'student_phone': student_phone,
-        'email': data.get('email', ''),
-        'dob': data.get('dob', ''),
-        'address': data.get('address', ''),
-        'batch': data.get('batch', ''),
-        'bus_id': bus_id_assigned,
-        'bus_number': bus_number_assigned,
-        'route_id': data.get('route_id', ''),
-        'route_name': data.get('route_name', ''),
-        'bus_stop': data.get('bus_stop', ''),
-        'payment_type': data.get('payment_type', ''),
-        'fee_amount': fee_amount,
-        'paid': 0,
-        'due': fee_amount,
-        'due': fee_amount,
-        'can_travel': False, # Initialized to False as per request (unless fee is 0 potentially, but user said initially false)
-        'created_at': firestore.SERVER_TIMESTAMP
-    }
-
-    if profile_photo_url:
-        student_data['profile_photo_url'] = profile_photo_url
-
-    student_ref.set(student_data)
-
-    return jsonify({'status': 'success', 'student_id': roll_number})
+    student_data = student_service.new_student_record(data, roll_number, fee_amount)
+
+    # Seat reservation and student write commit together in one transaction
+    try:
+        student_data = seat_service.create_student(uid, student_ref, student_data, bus_number_input)
+    except seat_service.SeatAllocationError as e:
+        return jsonify({'status': 'error', 'message': e.message}), e.status_code
+
+    search_service.upsert_student(uid, roll_number, student_data)
+    if student_data.get('bus_id'):
+        cache_service.invalidate(uid, 'buses')
+
+    # 📷 Photo is resized and uploaded in the background, then patched onto the student
+    photo_job_id = photo_service.queue_upload(uid, 'students', roll_number, request.files.get('student_photo'))
+
+    return jsonify({'status': 'success', 'student_id': roll_number, 'photo_job_id': photo_job_id})
+
+@api_bp.route('/api/import_students', methods=['POST'])
+def api_import_students():
+    if 'user' not in session or 'uid' not in session:
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    try:
+        uid = session['uid']
+        file = request.files.get('file')
+        if not file or not file.filename:
+            return jsonify({'status': 'error', 'message': 'CSV file required'}), 400
+
+        try:
+            rows = student_service.read_csv(file.stream)
+        except (UnicodeDecodeError, ValueError) as e:
+            return jsonify({'status': 'error', 'message': f'Could not read CSV: {e}'}), 400
+        if not rows:
+            return jsonify({'status': 'error', 'message': 'CSV has no student rows'}), 400
+
+        result = student_service.import_students(uid, rows)
+        return jsonify({'status': 'success', 'total': len(rows), **result})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@api_bp.route('/api/export/<dataset>', methods=['GET'])
+def api_export(dataset):
+    if 'user' not in session or 'uid' not in session:
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    if dataset not in export_service.DATASETS:
+        return jsonify({'status': 'error', 'message': f'Unknown export: {dataset}'}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'status': 'error', 'message': 'format must be csv or ndjson'}), 400
+
+    uid = session['uid']
+    filename = f"{dataset}_{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    # Rows are read and sent page by page, nothing is buffered for the whole org
+    return Response(stream_with_context(export_service.export(uid, dataset, fmt)), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no'
+    })
 
 @api_bp.route('/api/delete_student/<roll_number>', methods=['POST'])
 def api_delete_student(roll_number):
@@ -227,37 +293,23 @@ def api_delete_student(roll_number):
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
 
     uid = session['uid']
-    db = get_db()
 
-    student_ref = db.collection('organizations') \
-        .document(uid) \
-        .collection('students') \
-        .document(roll_number)
+    student_ref = repositories.students(uid).doc(roll_number)
+
+    # 1. Delete Firestore Document and release its bus seat in one transaction
+    student_data = seat_service.delete_student(uid, student_ref)
+    search_service.remove_student(uid, roll_number)
 
-    # 1. Fetch student data to get auth_uid
-    student_snap = student_ref.get()
     auth_uid = roll_number # Default fallback
-    
-    if student_snap.exists:
-        student_data = student_snap.to_dict()
+    if student_data:
         auth_uid = student_data.get('auth_uid', roll_number)
+        if student_data.get('bus_id'):
+            cache_service.invalidate(uid, 'buses')
 
-        # Release Bus Seat
-        bus_id = student_data.get('bus_id')
-        if bus_id:
-            bus_ref = db.collection('organizations').document(uid).collection('buses').document(bus_id)
-            bus_snap = bus_ref.get()
-            if bus_snap.exists:
-                current_avail = int(bus_snap.to_dict().get('avail_seats', 0))
-                bus_ref.update({'avail_seats': current_avail + 1})
-
-    # 2. Delete Firestore Document
-    student_ref.delete()
-
-    # 3. Delete Auth user
+    # 2. Delete Auth user (background job, retried on failure)
     try:
-        auth.delete_user(auth_uid)
-        print(f"Auth deleted for uid: {auth_uid}")
+        job_service.enqueue(uid, 'auth_delete', params={
+            'auth_uid': auth_uid, 'collection': 'students', 'record_id': roll_number})
     except Exception as e:
         print(f"Auth delete warning (uid: {auth_uid}): {e}")
 
@@ -276,7 +328,6 @@ def api_add_driver():
             data = request.form.to_dict()
             
         uid = session['uid']
-        db = get_db()
         
         # Ensure required fields are present
         required_fields = ['full_name', 'license_number', 'phone_number']
@@ -287,7 +338,7 @@ def api_add_driver():
         # VALIDATION: Check Bus Assignment BEFORE creating user
         bus_ref = None
         if data.get('assigned_bus'):
-            bus_ref = db.collection('organizations').document(uid).collection('buses').document(data['assigned_bus'])
+            bus_ref = repositories.buses(uid).doc(data['assigned_bus'])
             bus_snap = bus_ref.get()
             if bus_snap.exists:
                 b_data = bus_snap.to_dict()
@@ -304,13 +355,6 @@ def api_add_driver():
         else:
              return jsonify({'status': 'error', 'message': 'Phone number is required for driver login creation'}), 400
 
-        # Handle Driver Photo Upload
-        profile_photo_url = None
-        if 'driver_photo' in request.files:
-            file = request.files['driver_photo']
-            if file.filename:
-                profile_photo_url = upload_file(file, f"drivers/{uid}")
-
         driver_data = {
             'full_name': data['full_name'],
             'license_number': data['license_number'],
@@ -327,11 +371,8 @@ def api_add_driver():
             'can_add_stop': str(data.get('can_add_stop', 'false')).lower() == 'true'
         }
         
-        if profile_photo_url:
-            driver_data['profile_photo_url'] = profile_photo_url
-        
         # 2. Use Auth UID as Document ID
-        driver_ref = db.collection('organizations').document(uid).collection('drivers').document(driver_uid)
+        driver_ref = repositories.drivers(uid).doc(driver_uid)
         
         if driver_ref.get().exists:
             return jsonify({'status': 'error', 'message': 'Driver with this License Number already exists'}), 400
@@ -345,7 +386,11 @@ def api_add_driver():
                 'driver_name': data['full_name']
             })
 
-        return jsonify({'status': 'success', 'id': driver_ref.id, 'driver_uid': driver_uid})
+        cache_service.invalidate(uid, 'drivers', 'buses')
+
+        # Handle Driver Photo Upload (processed in the background)
+        photo_job_id = photo_service.queue_upload(uid, 'drivers', driver_uid, request.files.get('driver_photo'))
+        return jsonify({'status': 'success', 'id': driver_ref.id, 'driver_uid': driver_uid, 'photo_job_id': photo_job_id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -356,22 +401,21 @@ def api_add_bus():
     try:
         data = request.get_json()
         uid = session['uid']
-        db = get_db()
         
         # Check if registration number already exists
         reg_no = data.get('registration_no')
         if reg_no:
-            buses_ref = db.collection('organizations').document(uid).collection('buses')
+            buses_ref = repositories.buses(uid).ref
             query = buses_ref.where('registration_no', '==', reg_no).get()
             if len(query) > 0:
                  return jsonify({'status': 'error', 'message': 'Bus with this Registration Number already exists'}), 400
         
-        bus_ref = db.collection('organizations').document(uid).collection('buses').document()
+        bus_ref = repositories.buses(uid).doc()
         
         # Handle driver assignment
         driver_id = data.get('driver_id')
         if driver_id:
-            driver_ref = db.collection('organizations').document(uid).collection('drivers').document(driver_id)
+            driver_ref = repositories.drivers(uid).doc(driver_id)
             driver_data = driver_ref.get().to_dict()
             if driver_data.get('assigned_bus'):
                 return jsonify({'status': 'error', 'message': f"Driver {driver_data.get('full_name')} is already assigned to a bus."}), 400
@@ -383,7 +427,7 @@ def api_add_bus():
         # Handle route assignment
         route_id = data.get('route_id')
         if route_id:
-            route_ref = db.collection('organizations').document(uid).collection('routes').document(route_id)
+            route_ref = repositories.routes(uid).doc(route_id)
             route_ref.update({'assigned_bus': bus_ref.id})
 
         # Set available seats equal to capacity initially
@@ -394,6 +438,7 @@ def api_add_bus():
             data['avail_seats'] = 0
 
         bus_ref.set(data)
+        cache_service.invalidate(uid, 'buses', 'drivers', 'routes')
 
         # 🚀 Initialize Realtime Database for RFID
         try:
@@ -436,9 +481,9 @@ def api_add_route():
     try:
         data = request.get_json()
         uid = session['uid']
-        db = get_db()
-        route_ref = db.collection('organizations').document(uid).collection('routes').document()
+        route_ref = repositories.routes(uid).doc()
         route_ref.set(data)
+        cache_service.invalidate(uid, 'routes', 'buses')
         return jsonify({'status': 'success', 'id': route_ref.id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -450,27 +495,26 @@ def api_update_bus(bus_id):
     try:
         data = request.get_json()
         uid = session['uid']
-        db = get_db()
-        bus_ref = db.collection('organizations').document(uid).collection('buses').document(bus_id)
+        bus_ref = repositories.buses(uid).doc(bus_id)
         
         # Handle driver change if driver_id is provided
         if 'driver_id' in data:
             new_driver_id = data['driver_id']
             
             # Get current bus data to find old driver
-            current_bus = bus_ref.get().to_dict()
+            current_bus = request_memo.get_document(bus_ref).to_dict()
             old_driver_id = current_bus.get('driver_id')
             
             # If driver changed
             if old_driver_id != new_driver_id:
                 # Unassign from old driver if exists
                 if old_driver_id:
-                     old_driver_ref = db.collection('organizations').document(uid).collection('drivers').document(old_driver_id)
+                     old_driver_ref = repositories.drivers(uid).doc(old_driver_id)
                      old_driver_ref.update({'assigned_bus': ''})
                 
                 # Assign to new driver if exists
                 if new_driver_id:
-                    new_driver_ref = db.collection('organizations').document(uid).collection('drivers').document(new_driver_id)
+                    new_driver_ref = repositories.drivers(uid).doc(new_driver_id)
                     
                     # VALIDATION: Check if new driver is already assigned
                     nd_snap = new_driver_ref.get()
@@ -486,28 +530,24 @@ def api_update_bus(bus_id):
         if 'route_id' in data:
             new_route_id = data['route_id']
             
-            # Get current bus data to find old route
-            # Note: We might have already fetched current_bus above, but to be safe/clean re-fetch or use variable if scope allows.
-            # Ideally store current_bus at start of try block if used multiple times.
-            # For now, just re-fetch or assume 'current_bus' variable from driver block is accessible if defined.
-            # But driver block only runs if 'driver_id' in data. 
-            # So lets fetch safely.
-            current_bus_snap = bus_ref.get()
+            # Get current bus data to find old route (already read above if the driver changed)
+            current_bus_snap = request_memo.get_document(bus_ref)
             current_bus_data = current_bus_snap.to_dict()
             old_route_id = current_bus_data.get('route_id')
             
             if old_route_id != new_route_id:
                 # Unassign from old route if exists
                 if old_route_id:
-                     old_route_ref = db.collection('organizations').document(uid).collection('routes').document(old_route_id)
+                     old_route_ref = repositories.routes(uid).doc(old_route_id)
                      old_route_ref.update({'assigned_bus': ''})
                 
                 # Assign to new route if exists
                 if new_route_id:
-                    new_route_ref = db.collection('organizations').document(uid).collection('routes').document(new_route_id)
+                    new_route_ref = repositories.routes(uid).doc(new_route_id)
                     new_route_ref.update({'assigned_bus': bus_id})
 
         bus_ref.update(data)
+        cache_service.invalidate(uid, 'buses', 'drivers', 'routes')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -524,18 +564,7 @@ def api_update_driver(driver_id):
             data = request.form.to_dict()
             
         uid = session['uid']
-        db = get_db()
-        driver_ref = db.collection('organizations').document(uid).collection('drivers').document(driver_id)
-        
-        # Handle Photo Upload
-        profile_photo_url = None
-        if 'driver_photo' in request.files:
-            file = request.files['driver_photo']
-            if file.filename:
-                profile_photo_url = upload_file(file, f"drivers/{uid}")
-        
-        if profile_photo_url:
-            driver_data['profile_photo_url'] = profile_photo_url
+        driver_ref = repositories.drivers(uid).doc(driver_id)
         
         # Handle assigned_bus change
         if 'assigned_bus' in data:
@@ -548,7 +577,7 @@ def api_update_driver(driver_id):
              if old_bus_id != new_bus_id:
                  # Unassign from old bus if exists
                  if old_bus_id:
-                     old_bus_ref = db.collection('organizations').document(uid).collection('buses').document(old_bus_id)
+                     old_bus_ref = repositories.buses(uid).doc(old_bus_id)
                      old_bus_ref.update({
                          'driver_id': '',
                          'driver_name': ''
@@ -556,7 +585,7 @@ def api_update_driver(driver_id):
                  
                  # Assign to new bus if exists
                  if new_bus_id:
-                     new_bus_ref = db.collection('organizations').document(uid).collection('buses').document(new_bus_id)
+                     new_bus_ref = repositories.buses(uid).doc(new_bus_id)
                      
                      # VALIDATION: Check if bus is already assigned
                      nb_snap = new_bus_ref.get()
@@ -580,7 +609,11 @@ def api_update_driver(driver_id):
              update_data['can_add_stop'] = str(data.get('can_add_stop', 'false')).lower() == 'true'
 
         driver_ref.update(update_data)
-        return jsonify({'status': 'success'})
+        cache_service.invalidate(uid, 'drivers', 'buses')
+
+        # Handle Photo Upload (processed in the background)
+        photo_job_id = photo_service.queue_upload(uid, 'drivers', driver_id, request.files.get('driver_photo'))
+        return jsonify({'status': 'success', 'photo_job_id': photo_job_id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -591,9 +624,9 @@ def api_update_route(route_id):
     try:
         data = request.get_json()
         uid = session['uid']
-        db = get_db()
-        route_ref = db.collection('organizations').document(uid).collection('routes').document(route_id)
+        route_ref = repositories.routes(uid).doc(route_id)
         route_ref.update(data)
+        cache_service.invalidate(uid, 'routes')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -605,15 +638,14 @@ def api_add_payment(student_id):
     try:
         data = request.get_json()
         uid = session['uid']
-        db = get_db()
         
         # Validate data
         if not data.get('amount') or not data.get('date'):
              return jsonify({'status': 'error', 'message': 'Missing required fields'}), 400
 
         # Add payment to subcollection
-        student_doc_ref = db.collection('organizations').document(uid).collection('students').document(student_id)
-        payment_ref = student_doc_ref.collection('payments').document()
+        student_doc_ref = repositories.students(uid).doc(student_id)
+        payment_ref = repositories.payments(uid, student_id).doc()
         payment_ref.set(data)
         
         # Update student document totals (paid and due)
@@ -645,70 +677,26 @@ def api_update_student(roll_number):
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
 
     uid = session['uid']
-    db = get_db()
     data = request.form.to_dict() if not request.is_json else request.get_json()
 
-    # 🔍 Fetch Current Student Data for Comparison
-    student_curr_ref = db.collection('organizations').document(uid).collection('students').document(roll_number)
-    student_curr_snap = student_curr_ref.get()
-    
-    if not student_curr_snap.exists:
-        return jsonify({'status': 'error', 'message': 'Student not found'}), 404
-
-    student_curr = student_curr_snap.to_dict()
-    
-    # 🚍 Bus Assignment & Capacity Logic
-    # Check if bus_id is in data (meaning it's being updated/sent)
-    if 'bus_id' in data:
-        new_bus_id = data.get('bus_id')
-        old_bus_id = student_curr.get('bus_id')
-        
-        # If bus assignment is changing
-        if new_bus_id != old_bus_id:
-            # A. Assigning to a New Bus (New ID is present)
-            if new_bus_id:
-                # 1. Enforce No Dues Rule - REMOVED per user request
-                # current_due check was here.
-
-                
-                # 2. Check & Decrement Capacity
-                bus_new_ref = db.collection('organizations').document(uid).collection('buses').document(new_bus_id)
-                bus_new_snap = bus_new_ref.get()
-                if not bus_new_snap.exists:
-                    return jsonify({'status': 'error', 'message': 'Selected bus not found'}), 404
-                
-                bus_new_data = bus_new_snap.to_dict()
-                avail_seats = int(bus_new_data.get('avail_seats', 0))
-                
-                if avail_seats <= 0:
-                    return jsonify({'status': 'error', 'message': 'Selected bus is full (0 seats available).'}), 400
-                
-                bus_new_ref.update({'avail_seats': avail_seats - 1})
-                
-                # Update Route info as well from the new bus
-                data['route_name'] = bus_new_data.get('route', '')
-                data['route_id'] = bus_new_data.get('route_id', '')
-                data['bus_number'] = bus_new_data.get('bus_number', '') # Ensure bus number is synced too
-
-            # B. Unassigning from Old Bus (Old ID was present)
-            if old_bus_id:
-                bus_old_ref = db.collection('organizations').document(uid).collection('buses').document(old_bus_id)
-                bus_old_snap = bus_old_ref.get()
-                if bus_old_snap.exists:
-                    old_avail = int(bus_old_snap.to_dict().get('avail_seats', 0))
-                    bus_old_ref.update({'avail_seats': old_avail + 1})
+    student_curr_ref = repositories.students(uid).doc(roll_number)
 
     # 🚫 Never allow roll number change
     data.pop('roll_number', None)
 
-    # Photo update
-    if 'student_photo' in request.files:
-        file = request.files['student_photo']
-        if file.filename:
-            data['profile_photo_url'] = upload_file(file, f"students/{uid}")
+    # 🚍 Bus Assignment & Capacity: if bus_id changes, the seat moves in the same transaction
+    try:
+        data = seat_service.update_student(uid, student_curr_ref, data)
+    except seat_service.SeatAllocationError as e:
+        return jsonify({'status': 'error', 'message': e.message}), e.status_code
 
-    student_curr_ref.update(data)
-    return jsonify({'status': 'success'})
+    search_service.upsert_student(uid, roll_number, data)
+    if 'bus_id' in data:
+        cache_service.invalidate(uid, 'buses')
+
+    # Photo update (processed in the background)
+    photo_job_id = photo_service.queue_upload(uid, 'students', roll_number, request.files.get('student_photo'))
+    return jsonify({'status': 'success', 'photo_job_id': photo_job_id})
 
 @api_bp.route('/api/delete_driver/<driver_id>', methods=['POST'])
 def api_delete_driver(driver_id):
@@ -716,8 +704,7 @@ def api_delete_driver(driver_id):
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
     try:
         uid = session['uid']
-        db = get_db()
-        driver_ref = db.collection('organizations').document(uid).collection('drivers').document(driver_id)
+        driver_ref = repositories.drivers(uid).doc(driver_id)
         
         # Get driver data to find assigned bus and clean up
         driver_snap = driver_ref.get()
@@ -729,7 +716,7 @@ def api_delete_driver(driver_id):
         # Unassign from Bus if assigned
         assigned_bus_id = driver_data.get('assigned_bus')
         if assigned_bus_id:
-             bus_ref = db.collection('organizations').document(uid).collection('buses').document(assigned_bus_id)
+             bus_ref = repositories.buses(uid).doc(assigned_bus_id)
              bus_ref.update({
                  'driver_id': '',
                  'driver_name': ''
@@ -737,13 +724,14 @@ def api_delete_driver(driver_id):
 
         # Delete from Firestore
         driver_ref.delete()
+        cache_service.invalidate(uid, 'drivers', 'buses')
         
-        # Delete from Firebase Auth
+        # Delete from Firebase Auth (background job, retried on failure)
         try:
-            auth.delete_user(driver_id)
-            print(f"Successfully deleted auth user: {driver_id}")
+            job_service.enqueue(uid, 'auth_delete', params={
+                'auth_uid': driver_id, 'collection': 'drivers', 'record_id': driver_id})
         except Exception as auth_e:
-            print(f"Error deleting auth user (might not exist or other error): {auth_e}")
+            print(f"Error queueing auth user delete: {auth_e}")
             # We continue even if auth delete fails, as the main record is gone.
             
         return jsonify({'status': 'success'})
@@ -756,67 +744,65 @@ def api_live_trips():
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
     try:
         uid = session['uid']
-        db = get_db()
-        org_ref = db.collection('organizations').document(uid)
         
-        # Fetch Routes for mapping (could be optimized by cache or minimal fields)
-        routes_ref = org_ref.collection('routes')
-        route_map = {}
-        for r in routes_ref.stream():
-            rd = r.to_dict()
-            route_map[r.id] = rd.get('route_name', 'Unknown Route')
-
-        buses_ref = org_ref.collection('buses')
+        # Fetch Routes for mapping
+        route_map = {rid: name or 'Unknown Route' for rid, name in cache_service.get_field_map(uid, 'routes', 'route_name').items()}
+
+        # Buses carry live trip status, so they are always read fresh
+        buses_ref = repositories.buses(uid).ref
         buses_data = []
         
         for b in buses_ref.stream():
-            bus = b.to_dict()
-            bus_id = b.id
-            
-            # Map route name
-            r_id = bus.get('route_id')
-            route_name = route_map.get(r_id, 'No Route Assigned') if r_id else 'No Route Assigned'
-            
-            buses_data.append({
-                'id': bus_id,
-                'bus_number': bus.get('bus_number', ''),
-                'registration_no': bus.get('registration_no', ''),
-                'route_name': route_name,
-                'trip_status': bus.get('trip_status', 'Not Started'),
-                'on_board_count': bus.get('on_board_count', 0),
-                'capacity': bus.get('capacity', '-')
-            })
+            buses_data.append(live_trips_service.bus_payload(b.id, b.to_dict(), route_map))
             
         return jsonify({'status': 'success', 'buses': buses_data})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@api_bp.route('/api/live_trips/stream', methods=['GET'])
+def api_live_trips_stream():
+    if 'user' not in session or 'uid' not in session:
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    uid = session['uid']
+
+    limit = current_app.config.get('LIVE_STREAM_LIMIT', live_trips_service.DEFAULT_STREAM_LIMIT)
+    if not live_trips_service.acquire_stream(limit):
+        # All stream slots are busy: the dashboard falls back to polling /api/live_trips
+        return jsonify({'status': 'error', 'message': 'Too many live streams, poll instead'}), 503, {'Retry-After': '60'}
+
+    def events():
+        # One shared Firestore listener per org feeds every open tab
+        q = live_trips_service.subscribe(uid)
+        deadline = time.monotonic() + live_trips_service.STREAM_MAX_SECONDS
+        try:
+            while time.monotonic() < deadline:
+                try:
+                    event, payload = q.get(timeout=15)
+                except queue.Empty:
+                    # Keep proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+        finally:
+            live_trips_service.unsubscribe(uid, q)
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Runs when the connection closes, even if the generator never started
+    response.call_on_close(live_trips_service.release_stream)
+    return response
+
 @api_bp.route('/api/fix_bus_seats', methods=['GET'])
 def api_fix_bus_seats():
     if 'user' not in session or 'uid' not in session:
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
     try:
         uid = session['uid']
-        db = get_db()
-        
-        # 1. Get all buses
-        buses_ref = db.collection('organizations').document(uid).collection('buses')
-        buses = buses_ref.stream()
-        
-        updated_count = 0
-        details = []
-        
-        for doc in buses:
-            data = doc.to_dict()
-            capacity = int(data.get('capacity', 0))
-            # If avail_seats is missing or 0 (and capacity > 0), reset it.
-            # You might want more complex logic (e.g. check actual students), 
-            # but for a quick fix, resetting to capacity (assuming empty) is a start.
-            if 'avail_seats' not in data:
-                 doc.reference.update({'avail_seats': capacity})
-                 updated_count += 1
-        
-        return jsonify({'status': 'success', 'updated': updated_count})
+        # Recount runs in the background; poll /api/jobs/<job_id> for the result
+        job = job_service.enqueue(uid, 'seat_recount', job_id='seat_recount')
+        return jsonify({'status': 'success', 'job_id': job['id'], 'job': job})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -827,13 +813,12 @@ def api_add_stop():
     try:
         data = request.get_json()
         uid = session['uid']
-        db = get_db()
         
         # Basic Validation
         if not data.get('stop_name'):
              return jsonify({'status': 'error', 'message': 'Stop Name is required'}), 400
 
-        stop_ref = db.collection('organizations').document(uid).collection('stops').document()
+        stop_ref = repositories.stops(uid).doc()
         
         stop_data = {
             'stop_name': data.get('stop_name'),
@@ -844,6 +829,7 @@ def api_add_stop():
         }
         
         stop_ref.set(stop_data)
+        cache_service.invalidate(uid, 'stops')
         return jsonify({'status': 'success', 'id': stop_ref.id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -855,8 +841,7 @@ def api_update_stop(stop_id):
     try:
         data = request.get_json()
         uid = session['uid']
-        db = get_db()
-        stop_ref = db.collection('organizations').document(uid).collection('stops').document(stop_id)
+        stop_ref = repositories.stops(uid).doc(stop_id)
         
         updates = {}
         if 'stop_name' in data: updates['stop_name'] = data['stop_name']
@@ -865,6 +850,7 @@ def api_update_stop(stop_id):
         if 'fee' in data: updates['fee'] = float(data['fee'])
         
         stop_ref.update(updates)
+        cache_service.invalidate(uid, 'stops')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -875,60 +861,21 @@ def api_delete_stop(stop_id):
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
     try:
         uid = session['uid']
-        db = get_db()
-        stop_ref = db.collection('organizations').document(uid).collection('stops').document(stop_id)
+        stop_ref = repositories.stops(uid).doc(stop_id)
         stop_ref.delete()
+        cache_service.invalidate(uid, 'stops')
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
-        for bus in buses:
-            bus_data = bus.to_dict()
-            bus_id = bus.id
-            
-            # Get Capacity (handle string/int/missing)
-            try:
-                capacity = int(bus_data.get('capacity', 0))
-            except ValueError:
-                capacity = 0
-            
-            # 2. Count current students assigned to this bus
-            students_ref = db.collection('organizations').document(uid).collection('students')
-            # Firestore count query is efficient
-            count_query = students_ref.where('bus_id', '==', bus_id).count()
-            count_results = count_query.get()
-            current_on_board_count = count_results[0][0].value
-            
-            # 3. Calculate Available Seats
-            avail_seats = capacity - current_on_board_count
-            
-            # Update Bus
-            bus.reference.update({
-                'avail_seats': avail_seats,
-                'on_board_count': current_on_board_count # Optional: Sync this too if needed, but mainly avail_seats
-            })
-            
-            updated_count += 1
-            details.append(f"Bus {bus_data.get('bus_number')} ({bus_id}): Cap={capacity}, Alloc={current_on_board_count}, Avail={avail_seats}")
-
-        return jsonify({
-            'status': 'success', 
-            'message': f'Updated {updated_count} buses',
-            'details': details
-        })
-
-    except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
-
 @api_bp.route('/api/reset_fee_status/<student_id>', methods=['POST'])
 def api_reset_fee_status(student_id):
     if 'user' not in session or 'uid' not in session:
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
     try:
         uid = session['uid']
-        db = get_db()
         
-        student_ref = db.collection('organizations').document(uid).collection('students').document(student_id)
+        student_ref = repositories.students(uid).doc(student_id)
         student_snap = student_ref.get()
         
         if not student_snap.exists:
@@ -953,83 +900,20 @@ def api_reset_all_fees():
         return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
     try:
         uid = session['uid']
-        db = get_db()
-        
-        # 1. Build a Fee Lookup Map: RouteName -> StopName -> Fee
-        routes_ref = db.collection('organizations').document(uid).collection('routes')
-        fee_map = {} # {'Route A': {'Stop 1': 5000, 'Stop 2': 6000}}
-        
-        for r_doc in routes_ref.stream():
-            r_data = r_doc.to_dict()
-            r_name = r_data.get('route_name')
-            if r_name:
-                stops = r_data.get('stops', [])
-                # stops is a list of dicts: [{'name': 'Stop1', 'fee': '5000'}, ...]
-                stop_fees = {}
-                for s in stops:
-                    s_name = s.get('name')
-                    s_fee = s.get('fee', 0)
-                    try:
-                        stop_fees[s_name] = float(s_fee)
-                    except:
-                        stop_fees[s_name] = 0.0
-                fee_map[r_name] = stop_fees
-        
-        # 2. Iterate Students and Reset
-        students_ref = db.collection('organizations').document(uid).collection('students')
-        students = students_ref.stream()
-        
-        count = 0
-        batch = db.batch()
-        batch_count = 0
-        
-        today_str = datetime.now().strftime('%Y-%m-%d')
-        
-        for student in students:
-            student_data = student.to_dict()
-            
-            # Lookup current fee
-            route_name = student_data.get('route_name')
-            bus_stop = student_data.get('bus_stop')
-            current_fee = float(student_data.get('fee_amount', 0)) # Default to existing
-            
-            if route_name in fee_map and bus_stop in fee_map[route_name]:
-                current_fee = fee_map[route_name][bus_stop]
-            
-            batch.update(student.reference, {
-                'paid': 0,
-                'due': current_fee,     # Reset due to the CURRENT fee amount
-                'fee_amount': current_fee, # Update fee amount in case it changed
-                'can_travel': False,
-                'last_fee_reset_date': today_str
-            })
-            
-            batch_count += 1
-            
-            # Archive existing payments
-            payments_ref = student.reference.collection('payments')
-            # Only fetch non-archived ones ideally, or just all
-            for p_doc in payments_ref.stream():
-                batch.update(p_doc.reference, {'archived': True})
-                batch_count += 1
-                
-                if batch_count >= 400:
-                    batch.commit()
-                    batch = db.batch()
-                    batch_count = 0
-            
-            count += 1
-            
-            # Check batch limit
-            if batch_count >= 400:
-                batch.commit()
-                batch = db.batch()
-                batch_count = 0
-        
-        # Commit remaining
-        if batch_count > 0:
-            batch.commit()
-            
-        return jsonify({'status': 'success', 'message': f'Fee cycle reset for {count} students. History preserved (archived).'})
+        # Runs in the background; an interrupted run resumes from its last checkpoint
+        job = fee_reset_service.start(uid)
+        return jsonify({'status': 'success', 'job_id': job['id'], 'job': job, 'message': 'Fee cycle reset started.'})
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@api_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def api_job_status(job_id):
+    if 'user' not in session or 'uid' not in session:
+        return jsonify({'status': 'error', 'message': 'Unauthorized'}), 401
+    try:
+        job = job_service.get_job(session['uid'], job_id)
+        if not job:
+            return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+        return jsonify({'status': 'success', 'job': job})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -1,27 +1,70 @@
 from flask import Blueprint, render_template, session, redirect, url_for
 from app.services.firebase_service import get_db
+from app import repositories
+from app.services import cache_service, concurrency, boarding_service
 from firebase_admin import firestore
 
 buses_bp = Blueprint('buses', __name__)
 
+GET_ALL_CHUNK = 100
+IN_QUERY_LIMIT = 30 # Firestore allows at most 30 values in an 'in' filter
+# Student fields shown in the bus page tables (plus the ones scans are matched on)
+STUDENT_ROW_FIELDS = ['full_name', 'roll_number', 'rfid_tag_id', 'batch', 'bus_stop', 'parent_phone',
+                      'profile_photo_url', 'thumbnail_url']
+
+def resolve_students(db, students_ref, ids):
+    # Resolve scanned IDs in bulk: document ID first, then roll_number, then rfid_tag_id.
+    # Returns {scanned_id: student}; IDs that match nothing are left out.
+    resolved = {}
+
+    # 1. Document IDs, fetched together with get_all ('/' can never be part of a document ID)
+    doc_ids = [sid for sid in ids if '/' not in sid]
+    for i in range(0, len(doc_ids), GET_ALL_CHUNK):
+        refs = [students_ref.document(sid) for sid in doc_ids[i:i + GET_ALL_CHUNK]]
+        for snap in db.get_all(refs, field_paths=STUDENT_ROW_FIELDS):
+            if snap.exists:
+                s_data = snap.to_dict()
+                s_data['id'] = snap.id
+                resolved[snap.id] = s_data
+
+    remaining = [sid for sid in ids if sid not in resolved]
+    if not remaining:
+        return resolved
+
+    # 2. roll_number and rfid_tag_id 'in' queries, chunked and issued in parallel
+    def match_field(field, chunk):
+        return lambda: list(students_ref.where(field, 'in', chunk).select(STUDENT_ROW_FIELDS).stream())
+
+    calls = {}
+    for i in range(0, len(remaining), IN_QUERY_LIMIT):
+        chunk = remaining[i:i + IN_QUERY_LIMIT]
+        calls[f'roll_number_{i}'] = match_field('roll_number', chunk)
+        calls[f'rfid_tag_id_{i}'] = match_field('rfid_tag_id', chunk)
+    results = concurrency.gather(**calls)
+
+    by_field = {'roll_number': {}, 'rfid_tag_id': {}}
+    for name, snaps in results.items():
+        field = name.rsplit('_', 1)[0]
+        for snap in snaps:
+            s_data = snap.to_dict()
+            s_data['id'] = snap.id
+            by_field[field].setdefault(str(s_data.get(field)), s_data)
+
+    for sid in remaining:
+        found_student = by_field['roll_number'].get(sid) or by_field['rfid_tag_id'].get(sid)
+        if found_student:
+            resolved[sid] = found_student
+    return resolved
+
 @buses_bp.route('/buses')
 def buses():
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
-    buses_ref = db.collection('organizations').document(uid).collection('buses')
-    # Fetch drivers for mapping
-    drivers_ref = db.collection('organizations').document(uid).collection('drivers')
-    driver_map = {}
-    for d_doc in drivers_ref.stream():
-        d_data = d_doc.to_dict()
-        driver_map[d_doc.id] = d_data.get('full_name', 'Unknown Driver')
+    # Fetch driver names for mapping
+    driver_map = {did: name or 'Unknown Driver' for did, name in cache_service.get_field_map(uid, 'drivers', 'full_name').items()}
 
     buses = []
-    for doc in buses_ref.stream():
-        bus_data = doc.to_dict()
-        bus_data['id'] = doc.id
-        
+    for bus_data in cache_service.get_buses(uid):
         # Map driver ID to name
         did = bus_data.get('driver_id')
         if did and did in driver_map:
@@ -31,37 +74,46 @@ def buses():
              
         buses.append(bus_data)
 
-    # Fetch drivers
-    drivers_ref = db.collection('organizations').document(uid).collection('drivers')
-    drivers = []
-    for doc in drivers_ref.stream():
-        d_data = doc.to_dict()
-        d_data['id'] = doc.id
-        drivers.append(d_data)
-
-    # Fetch routes
-    routes_ref = db.collection('organizations').document(uid).collection('routes')
-    routes = []
-    for doc in routes_ref.stream():
-        r_data = doc.to_dict()
-        r_data['id'] = doc.id
-        routes.append(r_data)
-
-    return render_template('buses.html', buses=buses, drivers=drivers, routes=routes)
+    return render_template('buses.html', buses=buses)
 
 @buses_bp.route('/bus/<bus_id>')
 def bus_details(bus_id):
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
     db = get_db()
-    bus_ref = db.collection('organizations').document(uid).collection('buses').document(bus_id)
-    bus = bus_ref.get().to_dict()
+    bus_ref = repositories.buses(uid).doc(bus_id)
+
+    def fetch_trips():
+        # Fetch Trip History (Top 10 only)
+        try:
+            trips_ref = repositories.bus_trips(uid, bus_id).ref.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(10)
+            return list(trips_ref.stream())
+        except Exception as e:
+            print(f"Error fetching trip history: {e}")
+            return []
+
+    def fetch_assigned():
+        # Fetch all assigned students
+        try:
+            students_ref = repositories.students(uid).ref.where('bus_id', '==', bus_id)
+            return list(students_ref.select(STUDENT_ROW_FIELDS).stream())
+        except Exception as e:
+            print(f"Error fetching assigned students: {e}")
+            return []
+
+    # The reads below are independent of each other, so issue them in parallel
+    reads = concurrency.gather(
+        bus=bus_ref.get,
+        drivers=lambda: cache_service.get_drivers(uid),
+        routes=lambda: cache_service.get_routes(uid),
+        trips=fetch_trips,
+        assigned=fetch_assigned
+    )
+
+    bus = reads['bus'].to_dict()
     # Fetch drivers for mapping
-    drivers_ref = db.collection('organizations').document(uid).collection('drivers')
-    driver_map = {}
-    for d_doc in drivers_ref.stream():
-        d_data = d_doc.to_dict()
-        driver_map[d_doc.id] = d_data.get('full_name', 'Unknown Driver')
+    drivers = reads['drivers']
+    driver_map = {d['id']: d.get('full_name', 'Unknown Driver') for d in drivers}
 
     if bus:
         bus['id'] = bus_id
@@ -72,33 +124,23 @@ def bus_details(bus_id):
         else:
              bus['driver_name_display'] = bus.get('driver_name') if bus.get('driver_name') else 'Unassigned'
 
-    # Fetch Trip History (Top 10 only)
+    # Trip History (Top 10 only)
     trip_history = []
     latest_trip = None
-    try:
-        trips_ref = bus_ref.collection('trip_history').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(10)
-        trips_stream = list(trips_ref.stream())
+    for t_doc in reads['trips']:
+        t_data = t_doc.to_dict()
+        t_data['id'] = t_doc.id
+        trip_history.append(t_data)
         
-        for t_doc in trips_stream:
-            t_data = t_doc.to_dict()
-            t_data['id'] = t_doc.id
-            trip_history.append(t_data)
-            
-        if trip_history:
-            latest_trip = trip_history[0]
-    except Exception as e:
-        print(f"Error fetching trip history: {e}")
+    if trip_history:
+        latest_trip = trip_history[0]
 
-    # Fetch all assigned students
+    # All assigned students
     assigned_students = []
-    try:
-        students_ref = db.collection('organizations').document(uid).collection('students').where('bus_id', '==', bus_id)
-        for s_doc in students_ref.stream():
-            s_data = s_doc.to_dict()
-            s_data['id'] = s_doc.id
-            assigned_students.append(s_data)
-    except Exception as e:
-        print(f"Error fetching assigned students: {e}")
+    for s_doc in reads['assigned']:
+        s_data = s_doc.to_dict()
+        s_data['id'] = s_doc.id
+        assigned_students.append(s_data)
 
     # Fetch boarded students if there is an active trip
     boarded_students = []
@@ -110,31 +152,9 @@ def bus_details(bus_id):
              if 'boarded_student_ids' in latest_trip:
                  student_ids = latest_trip.get('boarded_student_ids', [])
              
-             # Option 2: If no list, check for 'scans' map/list
+             # Option 2: If no list, replay the 'scans' map/list (cached per trip, new scans only)
              if not student_ids and 'scans' in latest_trip:
-                 scans = latest_trip.get('scans')
-                 if isinstance(scans, list):
-                     for s in scans:
-                         # Handle both snake_case and camelCase
-                         sid = s.get('cardId') or s.get('studentId')
-                         stype = s.get('scanType')
-                         
-                         if stype == 'entry':
-                             student_ids.append(sid)
-                         elif stype == 'exit':
-                             if sid in student_ids:
-                                 student_ids.remove(sid)
-                 elif isinstance(scans, dict):
-                     for k, v in scans.items():
-                         # Handle both snake_case and camelCase
-                         sid = v.get('cardId') or v.get('studentId')
-                         stype = v.get('scanType')
-                         
-                         if stype == 'entry':
-                             student_ids.append(sid)
-                         elif stype == 'exit':
-                             if sid in student_ids:
-                                 student_ids.remove(sid)
+                 student_ids = boarding_service.onboard_ids(uid, bus_id, latest_trip)
 
              print(f"[DEBUG] Bus {bus_id} Trip {latest_trip.get('id')} Status: {trip_status}")
              print(f"[DEBUG] Raw IDs: {student_ids}")
@@ -148,75 +168,31 @@ def bus_details(bus_id):
                  # Also map by roll_number just in case
                  assigned_roll_map = {str(s.get('roll_number')): s for s in assigned_students if s.get('roll_number')}
                  
-                 refs_to_fetch = []
                  fetched_ids = set()
 
+                 # 2. Fallback: Student might not be assigned or ID mismatch.
+                 # Resolve every remaining ID in bulk by document ID, roll_number or rfid_tag_id
+                 unresolved = [sid for sid in student_ids if sid not in assigned_map and sid not in assigned_roll_map]
+                 resolved_map = {}
+                 if unresolved:
+                     try:
+                         students_ref = repositories.students(uid).ref
+                         resolved_map = resolve_students(db, students_ref, unresolved)
+                     except Exception as e:
+                         print(f"Error resolving students {unresolved}: {e}")
+
                  for sid in student_ids:
-                     found_student = None
-                     if sid in assigned_map:
-                         found_student = assigned_map[sid]
-                     elif sid in assigned_roll_map:
-                         found_student = assigned_roll_map[sid]
-                     
-                     if found_student:
-                         if found_student['id'] not in fetched_ids:
-                             s_data = found_student.copy()
-                             s_data['boarding_status'] = 'On Board'
-                             boarded_students.append(s_data)
-                             fetched_ids.add(found_student['id'])
-                     else:
-                         # Fallback: Student might not be assigned or ID mismatch
-                         # Try querying by roll_number or rfid_tag_id
-                         try:
-                             # Try fetching by ID first (if valid ID)
-                             s_doc_ref = db.collection('organizations').document(uid).collection('students').document(sid)
-                             s_snap = s_doc_ref.get()
-                             
-                             if s_snap.exists:
-                                 found_student = s_snap.to_dict()
-                                 found_student['id'] = s_snap.id
-                             else:
-                                 # Query by roll_number
-                                 query = db.collection('organizations').document(uid).collection('students').where('roll_number', '==', sid).limit(1)
-                                 query_snaps = list(query.stream())
-                                 if query_snaps:
-                                     found_student = query_snaps[0].to_dict()
-                                     found_student['id'] = query_snaps[0].id
-                                 else:
-                                     # Query by rfid_tag_id
-                                     query_rfid = db.collection('organizations').document(uid).collection('students').where('rfid_tag_id', '==', sid).limit(1)
-                                     rfid_snaps = list(query_rfid.stream())
-                                     if rfid_snaps:
-                                         found_student = rfid_snaps[0].to_dict()
-                                         found_student['id'] = rfid_snaps[0].id
-
-                             if found_student and found_student.get('id') not in fetched_ids:
-                                  s_data = found_student.copy()
-                                  s_data['boarding_status'] = 'On Board'
-                                  boarded_students.append(s_data)
-                                  fetched_ids.add(found_student['id'])
-                                  
-                         except Exception as e:
-                             print(f"Error resolving student {sid}: {e}")
+                     found_student = assigned_map.get(sid) or assigned_roll_map.get(sid) or resolved_map.get(sid)
+                     if found_student and found_student['id'] not in fetched_ids:
+                         s_data = found_student.copy()
+                         s_data['boarding_status'] = 'On Board'
+                         boarded_students.append(s_data)
+                         fetched_ids.add(found_student['id'])
 
         except Exception as e:
              print(f"Error fetching boarded students: {e}")
 
-    # Fetch drivers
-    drivers_ref = db.collection('organizations').document(uid).collection('drivers')
-    drivers = []
-    for doc in drivers_ref.stream():
-        d_data = doc.to_dict()
-        d_data['id'] = doc.id
-        drivers.append(d_data)
-
-    # Fetch routes
-    routes_ref = db.collection('organizations').document(uid).collection('routes')
-    routes = []
-    for doc in routes_ref.stream():
-        r_data = doc.to_dict()
-        r_data['id'] = doc.id
-        routes.append(r_data)
+    routes = reads['routes']
 
     return render_template('bus_details.html', bus=bus, drivers=drivers, routes=routes, trip_history=trip_history, boarded_students=boarded_students, assigned_students=assigned_students)
 
@@ -224,15 +200,14 @@ def bus_details(bus_id):
 def bus_trip_history(bus_id):
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
-    bus_ref = db.collection('organizations').document(uid).collection('buses').document(bus_id)
+    bus_ref = repositories.buses(uid).doc(bus_id)
     bus = bus_ref.get().to_dict()
     if bus: bus['id'] = bus_id
     
     trip_history = []
     try:
         # Fetch ALL history (or reasonably large limit)
-        trips_ref = bus_ref.collection('trip_history').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(100)
+        trips_ref = repositories.bus_trips(uid, bus_id).ref.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(100)
         trips_stream = trips_ref.stream()
         
         for t_doc in trips_stream:
@@ -248,22 +223,11 @@ def bus_trip_history(bus_id):
 def add_bus():
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
 
     # Fetch drivers
-    drivers_ref = db.collection('organizations').document(uid).collection('drivers')
-    drivers = []
-    for doc in drivers_ref.stream():
-        d_data = doc.to_dict()
-        d_data['id'] = doc.id
-        drivers.append(d_data)
+    drivers = cache_service.get_drivers(uid)
 
     # Fetch routes
-    routes_ref = db.collection('organizations').document(uid).collection('routes')
-    routes = []
-    for doc in routes_ref.stream():
-        r_data = doc.to_dict()
-        r_data['id'] = doc.id
-        routes.append(r_data)
+    routes = cache_service.get_routes(uid)
 
     return render_template('add_bus.html', drivers=drivers, routes=routes)
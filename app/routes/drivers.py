@@ -1,6 +1,7 @@
 
 from flask import Blueprint, render_template, session, redirect, url_for
-from app.services.firebase_service import get_db
+from app import repositories
+from app.services import cache_service
 from firebase_admin import firestore
 
 drivers_bp = Blueprint('drivers', __name__)
@@ -9,21 +10,12 @@ drivers_bp = Blueprint('drivers', __name__)
 def drivers():
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
-    drivers_ref = db.collection('organizations').document(uid).collection('drivers')
     
     # Fetch buses for mapping
-    buses_ref = db.collection('organizations').document(uid).collection('buses')
-    bus_map = {}
-    for b_doc in buses_ref.stream():
-        b_data = b_doc.to_dict()
-        bus_map[b_doc.id] = b_data.get('bus_number', 'Unknown Bus')
+    bus_map = {bid: number or 'Unknown Bus' for bid, number in cache_service.get_field_map(uid, 'buses', 'bus_number').items()}
 
     drivers = []
-    for doc in drivers_ref.stream():
-        driver_data = doc.to_dict()
-        driver_data['id'] = doc.id
-        
+    for driver_data in cache_service.get_drivers(uid):
         # Map bus ID to name
         bid = driver_data.get('assigned_bus')
         if bid and bid in bus_map:
@@ -38,21 +30,14 @@ def drivers():
 def driver_details(driver_id):
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
-    driver_ref = db.collection('organizations').document(uid).collection('drivers').document(driver_id)
+    driver_ref = repositories.drivers(uid).doc(driver_id)
     driver = driver_ref.get().to_dict()
     if driver:
         driver['id'] = driver_id
 
     # Fetch buses for dropdown and mapping
-    buses_ref = db.collection('organizations').document(uid).collection('buses')
-    buses = []
-    bus_map = {}
-    for doc in buses_ref.stream():
-        b_data = doc.to_dict()
-        b_data['id'] = doc.id
-        buses.append(b_data)
-        bus_map[doc.id] = b_data.get('bus_number', 'Unknown')
+    buses = cache_service.get_buses(uid)
+    bus_map = {b['id']: b.get('bus_number', 'Unknown') for b in buses}
         
     if driver:
         bid = driver.get('assigned_bus')
@@ -65,7 +50,7 @@ def driver_details(driver_id):
     trip_history = []
     try:
         # Direct query to driver's trip_history subcollection
-        trips_ref = driver_ref.collection('trip_history').order_by('timestamp', direction=firestore.Query.DESCENDING).limit(50)
+        trips_ref = repositories.driver_trips(uid, driver_id).ref.order_by('timestamp', direction=firestore.Query.DESCENDING).limit(50)
         
         for t_doc in trips_ref.stream():
             t_data = t_doc.to_dict()
@@ -92,14 +77,8 @@ def add_driver():
     if 'user' not in session: return redirect(url_for('auth.login'))
     
     uid = session.get('uid')
-    db = get_db()
     
     # Fetch buses for dropdown
-    buses_ref = db.collection('organizations').document(uid).collection('buses')
-    buses = []
-    for doc in buses_ref.stream():
-        b_data = doc.to_dict()
-        b_data['id'] = doc.id
-        buses.append(b_data)
+    buses = cache_service.get_buses(uid)
 
     return render_template('add_driver.html', buses=buses)
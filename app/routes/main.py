@@ -1,5 +1,7 @@
 from flask import Blueprint, render_template, session, redirect, url_for
-from app.services.firebase_service import get_db
+from app.services.firebase_service import count_documents
+from app import repositories
+from app.services import cache_service
 
 main_bp = Blueprint('main', __name__)
 
@@ -9,8 +11,7 @@ def index():
         return redirect(url_for('auth.login'))
     
     uid = session.get('uid')
-    db = get_db()
-    org_ref = db.collection('organizations').document(uid)
+    org_ref = repositories.org_ref(uid)
     org_doc = org_ref.get()
     org_name = 'Smart Bus Admin'
     if org_doc.exists:
@@ -18,29 +19,18 @@ def index():
         org_name = org_data.get('name', 'Smart Bus Admin')
 
     # Fetch Routes for mapping
-    routes_ref = org_ref.collection('routes')
-    route_map = {}
-    for r in routes_ref.stream():
-        rd = r.to_dict()
-        route_map[r.id] = rd.get('route_name', 'Unknown Route')
+    route_map = {rid: name or 'Unknown Route' for rid, name in cache_service.get_field_map(uid, 'routes', 'route_name').items()}
 
     # Fetch Buses
-    buses_ref = org_ref.collection('buses')
     buses = []
     
-    # Fetch Students for count
-    students_ref = org_ref.collection('students')
-    # Simple count for students (efficient enough for small datasets)
-    # For large datasets, use aggregation queries or counters.
-    total_students = len(list(students_ref.stream())) 
+    # Count students server-side (aggregation query, no documents downloaded)
+    total_students = count_documents(repositories.students(uid).ref)
     
-    # Fetch Drivers for count
-    drivers_ref = org_ref.collection('drivers')
-    total_drivers = len(list(drivers_ref.stream()))
+    # Drivers are already held by the reference cache
+    total_drivers = len(cache_service.get_drivers(uid))
 
-    for b in buses_ref.stream():
-        bus = b.to_dict()
-        bus['id'] = b.id
+    for bus in cache_service.get_buses(uid):
         # Map route name
         r_id = bus.get('route_id')
         if r_id and r_id in route_map:
@@ -66,8 +56,7 @@ def index():
 def profile():
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
-    org_ref = db.collection('organizations').document(uid)
+    org_ref = repositories.org_ref(uid)
     org_doc = org_ref.get()
     org = org_doc.to_dict() if org_doc.exists else {}
     return render_template('profile.html', org=org)
@@ -1,5 +1,6 @@
 from flask import Blueprint, render_template, session, redirect, url_for
-from app.services.firebase_service import get_db
+from app import repositories
+from app.services import cache_service
 
 routes_bp = Blueprint('routes', __name__)
 
@@ -9,25 +10,15 @@ routes_bp = Blueprint('routes', __name__)
 def routes():
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
-    routes_ref = db.collection('organizations').document(uid).collection('routes')
-    routes = []
-    for doc in routes_ref.stream():
-        route_data = doc.to_dict()
-        route_data['id'] = doc.id
-        routes.append(route_data)
+    routes = cache_service.get_routes(uid)
     
     # Use sample data if no routes found
     if not routes:
         pass # No routes, just empty list
     else:
         # Fetch buses to map IDs to Names
-        buses_ref = db.collection('organizations').document(uid).collection('buses')
-        bus_map = {}
-        for b_doc in buses_ref.stream():
-            b_data = b_doc.to_dict()
-            # Map ID to Bus Number
-            bus_map[b_doc.id] = b_data.get('bus_number', 'Unknown Bus')
+        # Map ID to Bus Number
+        bus_map = {bid: number or 'Unknown Bus' for bid, number in cache_service.get_field_map(uid, 'buses', 'bus_number').items()}
             
         # Update routes with bus name
         for route in routes:
@@ -46,15 +37,9 @@ def stops():
         return redirect(url_for('auth.login'))
     
     uid = session['uid']
-    db = get_db()
     
     # Fetch all global stops
-    stops_ref = db.collection('organizations').document(uid).collection('stops').order_by('stop_name')
-    all_stops = []
-    for s_doc in stops_ref.stream():
-        s_data = s_doc.to_dict()
-        s_data['id'] = s_doc.id
-        all_stops.append(s_data)
+    all_stops = cache_service.get_stops(uid)
 
     return render_template('stops.html', all_stops=all_stops)
 
@@ -62,26 +47,19 @@ def stops():
 def route_details(route_id):
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
     
     # Check if it's a sample route (REMOVED)
     if False: 
         pass
     else:
-        route_ref = db.collection('organizations').document(uid).collection('routes').document(route_id)
+        route_ref = repositories.routes(uid).doc(route_id)
         route = route_ref.get().to_dict()
         if route:
             route['id'] = route_id
             
     # Fetch buses for dropdown
-    buses_ref = db.collection('organizations').document(uid).collection('buses')
-    buses = []
-    bus_map = {}
-    for doc in buses_ref.stream():
-        b_data = doc.to_dict()
-        b_data['id'] = doc.id
-        buses.append(b_data)
-        bus_map[doc.id] = b_data.get('bus_number', 'Unknown')
+    buses = cache_service.get_buses(uid)
+    bus_map = {b['id']: b.get('bus_number', 'Unknown') for b in buses}
 
     # Add assigned_bus_name
     if route:
@@ -92,14 +70,8 @@ def route_details(route_id):
             route['assigned_bus_name'] = aid if aid else 'Unassigned'
 
     # Fetch global stops for adding to route
-    stops_ref = db.collection('organizations').document(uid).collection('stops').order_by('stop_name')
-    all_stops = []
-    stop_map = {}
-    for s_doc in stops_ref.stream():
-        s_data = s_doc.to_dict()
-        s_data['id'] = s_doc.id
-        all_stops.append(s_data)
-        stop_map[s_doc.id] = s_data
+    all_stops = cache_service.get_stops(uid)
+    stop_map = {s['id']: s for s in all_stops}
 
     # Enrich route stops with coordinates
     if route and 'stops' in route and isinstance(route['stops'], list):
@@ -137,14 +109,8 @@ def route_details(route_id):
 def add_route():
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
     
     # Fetch buses for dropdown
-    buses_ref = db.collection('organizations').document(uid).collection('buses')
-    buses = []
-    for doc in buses_ref.stream():
-        b_data = doc.to_dict()
-        b_data['id'] = doc.id
-        buses.append(b_data)
+    buses = cache_service.get_buses(uid)
         
     return render_template('add_route.html', buses=buses)
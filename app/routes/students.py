@@ -1,8 +1,52 @@
 from flask import Blueprint, render_template, session, redirect, url_for, request
 from app.services.firebase_service import get_db
+from app import repositories
+from app.services import cache_service, search_service, concurrency
 
 students_bp = Blueprint('students', __name__)
 
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def fetch_page(query, page_size):
+    # Read one page plus one extra document to know whether another page exists.
+    # Returns (students, next_cursor); next_cursor is None on the last page.
+    docs = list(query.limit(page_size + 1).stream())
+    page = []
+    for doc in docs[:page_size]:
+        student = doc.to_dict()
+        student['id'] = doc.id
+        page.append(student)
+    next_cursor = page[-1]['id'] if len(docs) > page_size else None
+    return page, next_cursor
+
+def search_page(db, students_ref, uid, search_query, filters, cursor, page_size):
+    # Match name/roll number in the in-memory index, apply the remaining filters
+    # on the indexed fields, then fetch only the page's documents.
+    entries = search_service.search(uid, search_query)
+    if filters['bus']:
+        entries = [e for e in entries if e['bus_number'] == filters['bus']]
+    if filters['route']:
+        entries = [e for e in entries if e['route_name'] == filters['route']]
+    if filters['assignment'] == 'assigned':
+        entries = [e for e in entries if e['bus_number']]
+    elif filters['assignment'] == 'unassigned':
+        entries = [e for e in entries if not e['bus_number']]
+    if cursor:
+        entries = [e for e in entries if e['id'] > cursor]
+
+    page_entries = entries[:page_size]
+    next_cursor = page_entries[-1]['id'] if len(entries) > page_size else None
+    snaps = db.get_all([students_ref.document(e['id']) for e in page_entries])
+    page = []
+    for snap in snaps:
+        if snap.exists:
+            student = snap.to_dict()
+            student['id'] = snap.id
+            page.append(student)
+    page.sort(key=lambda s: s['id'])
+    return page, next_cursor
+
 @students_bp.route('/students')
 def students():
     if 'user' not in session: return redirect(url_for('auth.login'))
@@ -15,86 +59,82 @@ def students():
     bus_filter = request.args.get('bus', '')
     route_filter = request.args.get('route', '')
 
-    # Fetch all students (Filter in memory for flexibility)
-    students_ref = db.collection('organizations').document(uid).collection('students')
-    all_students = []
-    for doc in students_ref.stream():
-        student = doc.to_dict()
-        student['id'] = doc.id
-        all_students.append(student)
+    try:
+        page_size = max(1, min(int(request.args.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        page_size = PAGE_SIZE
+    cursor = request.args.get('cursor', '')
 
-    # Apply Filters
-    filtered_students = []
-    for s in all_students:
-        # Search (Name or Roll Number)
-        if search_query:
-            full_name = s.get('full_name', '').lower()
-            roll = s.get('roll_number', '').lower()
-            if search_query not in full_name and search_query not in roll:
-                continue
-        
-        # Assignment Filter
-        if assignment_filter == 'assigned':
-            if not s.get('bus_number'): continue
-        elif assignment_filter == 'unassigned':
-            if s.get('bus_number'): continue
-            
-        # Bus Filter
+    students_ref = repositories.students(uid).ref
+    filters = {
+        'q': request.args.get('q', ''),
+        'assignment': assignment_filter,
+        'bus': bus_filter,
+        'route': route_filter
+    }
+
+    # Push bus/route/assignment filters down into the Firestore query
+    query = students_ref
+    if bus_filter:
+        query = query.where('bus_number', '==', bus_filter)
+    if route_filter:
+        # Basic check on stored route_name
+        query = query.where('route_name', '==', route_filter)
+
+    empty = False
+    if assignment_filter == 'assigned' and not bus_filter:
+        # Inequality filters must be ordered on the same field first
+        query = query.where('bus_number', '!=', '').order_by('bus_number')
+    elif assignment_filter == 'unassigned':
         if bus_filter:
-            if s.get('bus_number') != bus_filter: continue
-            
-        # Route Filter
-        if route_filter:
-            # Route logic is a bit complex as it might be 'route_name' or derived from bus
-            # Basic check on stored route_name
-            if s.get('route_name') != route_filter: continue
+            empty = True
+        else:
+            # Empty or null; students stored without the field at all are
+            # backfilled by the seat recount job (Firestore can't match a missing field)
+            query = query.where('bus_number', 'in', ['', None])
+    # Stable order by document ID so cursors can resume where a page ended
+    query = query.order_by('__name__')
 
-        filtered_students.append(s)
+    if empty:
+        filtered_students, next_cursor = [], None
+    elif search_query:
+        # Search (Name or Roll Number) is served by the in-memory index
+        filtered_students, next_cursor = search_page(db, students_ref, uid, search_query, filters, cursor, page_size)
+    else:
+        if cursor:
+            cursor_snap = students_ref.document(cursor).get()
+            if cursor_snap.exists:
+                query = query.start_after(cursor_snap)
+        filtered_students, next_cursor = fetch_page(query, page_size)
 
     # Fetch Buses and Routes for Filter Dropdowns
-    buses_ref = db.collection('organizations').document(uid).collection('buses')
-    buses = [d.to_dict() for d in buses_ref.stream()]
+    buses = cache_service.get_buses(uid)
     buses.sort(key=lambda x: x.get('bus_number', ''))
 
-    routes_ref = db.collection('organizations').document(uid).collection('routes')
-    routes = [d.to_dict() for d in routes_ref.stream()]
+    routes = cache_service.get_routes(uid)
     routes.sort(key=lambda x: x.get('route_name', ''))
 
     return render_template('students.html', 
                            students=filtered_students, 
                            buses=buses, 
                            routes=routes,
-                           filters={
-                               'q': request.args.get('q', ''),
-                               'assignment': assignment_filter,
-                               'bus': bus_filter,
-                               'route': route_filter
-                           })
+                           next_cursor=next_cursor,
+                           cursor=cursor,
+                           filters=filters)
 
 @students_bp.route('/add_student')
 def add_student():
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
     
     # Fetch buses
-    buses_ref = db.collection('organizations').document(uid).collection('buses')
-    buses = []
-    for doc in buses_ref.stream():
-        b_data = doc.to_dict()
-        b_data['id'] = doc.id
-        buses.append(b_data)
+    buses = cache_service.get_buses(uid)
 
     # Fetch routes
-    routes_ref = db.collection('organizations').document(uid).collection('routes')
-    routes = []
-    for doc in routes_ref.stream():
-        r_data = doc.to_dict()
-        r_data['id'] = doc.id
-        routes.append(r_data)
+    routes = cache_service.get_routes(uid)
 
     # Fetch Organization Settings
-    org_ref = db.collection('organizations').document(uid)
+    org_ref = repositories.org_ref(uid)
     org_doc = org_ref.get()
     payment_type = 'Monthly' # Default
     if org_doc.exists:
@@ -107,21 +147,39 @@ def add_student():
 def student_details(student_id):
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
-    student_ref = db.collection('organizations').document(uid).collection('students').document(student_id)
-    student = student_ref.get().to_dict()
+    org_ref = repositories.org_ref(uid)
+    student_ref = repositories.students(uid).doc(student_id)
+
+    def fetch_attendance():
+        # Fetch attendance (Optimize: Limit to recent docs for main view, though we need to parse them)
+        # We fetch a reasonable buffer (e.g. 15 days) to ensure we get 10 trips
+        # Firestore querying limitations mean we can't easily query 'inside' the doc structure for trips.
+        # So we fetch recent days.
+        try:
+            # Assuming 'date' field exists for sorting.
+            q = repositories.daily_attendance(uid, student_id).ref.order_by('date', direction='DESCENDING').limit(20)
+            return list(q.stream())
+        except Exception as e:
+            print(f"Error fetching attendance: {e}")
+            return []
+
+    # The reads below are independent of each other, so issue them in parallel
+    reads = concurrency.gather(
+        student=student_ref.get,
+        buses=lambda: cache_service.get_buses(uid),
+        routes=lambda: cache_service.get_routes(uid),
+        payments=lambda: list(repositories.payments(uid, student_id).ref.order_by('date', direction='DESCENDING').stream()),
+        attendance=fetch_attendance,
+        org=org_ref.get
+    )
+
+    student = reads['student'].to_dict()
     if student:
         student['id'] = student_id
 
         # Fetch buses
-        buses_ref = db.collection('organizations').document(uid).collection('buses')
-        buses = []
-        bus_route_map = {}
-        for doc in buses_ref.stream():
-            b_data = doc.to_dict()
-            b_data['id'] = doc.id
-            buses.append(b_data)
-            bus_route_map[doc.id] = b_data.get('route', '') # Map ID to Route Name
+        buses = reads['buses']
+        bus_route_map = {b['id']: b.get('route', '') for b in buses} # Map ID to Route Name
         
         # Fallback: If student doesn't have route_name, try to get it from assigned bus
         if not student.get('route_name'):
@@ -130,19 +188,13 @@ def student_details(student_id):
                  student['route_name'] = bus_route_map[bus_id]
 
         # Fetch routes
-        routes_ref = db.collection('organizations').document(uid).collection('routes')
-        routes = []
-        for doc in routes_ref.stream():
-            r_data = doc.to_dict()
-            r_data['id'] = doc.id
-            routes.append(r_data)
+        routes = reads['routes']
         
         # Fetch payments
-        payments_ref = student_ref.collection('payments')
         payments = []
         total_paid = 0
         
-        for doc in payments_ref.order_by('date', direction='DESCENDING').stream():
+        for doc in reads['payments']:
             p_data = doc.to_dict()
             p_data['id'] = doc.id
             p_date = p_data.get('date')
@@ -160,16 +212,10 @@ def student_details(student_id):
         fee_amount = float(student.get('fee_amount', 0))
         balance = fee_amount - total_paid
 
-        # Fetch attendance (Optimize: Limit to recent docs for main view, though we need to parse them)
-        attendance_ref = student_ref.collection('attendance')
-        # We fetch a reasonable buffer (e.g. 15 days) to ensure we get 10 trips
-        # Firestore querying limitations mean we can't easily query 'inside' the doc structure for trips.
-        # So we fetch recent days.
+        # Transform recent attendance days into trip records
         attendance_records = []
         try:
-            # Assuming 'date' field exists for sorting.
-            q = attendance_ref.order_by('date', direction='DESCENDING').limit(20)
-            for doc in q.stream():
+            for doc in reads['attendance']:
                 if doc.id == 'stats': continue
                 a_data = doc.to_dict()
                 a_data['id'] = doc.id
@@ -205,9 +251,8 @@ def student_details(student_id):
         # Slice Top 10
         recent_attendance = attendance_records[:10]
 
-        # Fetch Organization Settings for Payment Type
-        org_ref = db.collection('organizations').document(uid)
-        org_doc = org_ref.get()
+        # Organization Settings for Payment Type
+        org_doc = reads['org']
         org_payment_type = 'Monthly' # Default
         if org_doc.exists:
             org_data = org_doc.to_dict()
@@ -221,8 +266,7 @@ def student_details(student_id):
 def student_attendance_history(student_id):
     if 'user' not in session: return redirect(url_for('auth.login'))
     uid = session.get('uid')
-    db = get_db()
-    student_ref = db.collection('organizations').document(uid).collection('students').document(student_id)
+    student_ref = repositories.students(uid).doc(student_id)
     student = student_ref.get().to_dict()
     
     if not student:
@@ -232,7 +276,7 @@ def student_attendance_history(student_id):
     attendance_records = []
     try:
         # Update: Fetch from 'attendance_record' collection
-        attendance_ref = student_ref.collection('attendance_record').order_by('timestamp', direction='DESCENDING').limit(50)
+        attendance_ref = repositories.attendance(uid, student_id).ref.order_by('timestamp', direction='DESCENDING').limit(50)
         
         for doc in attendance_ref.stream():
             a_data = doc.to_dict()
@@ -0,0 +1,57 @@
+import threading
+from collections import OrderedDict
+
+# On-board sets for active trips, derived from the trip's entry/exit scans.
+# Scans are appended by the bus devices, so for list-shaped 'scans' we keep the
+# per-student counts and only replay the scans added since the last page view.
+MAX_TRIPS = 512
+
+_trips = OrderedDict()  # {(uid, bus_id, trip_id): (scans_seen, counts)}
+_lock = threading.Lock()
+
+
+def _apply(counts, scans):
+    for s in scans:
+        if not isinstance(s, dict):
+            continue
+        # Handle both snake_case and camelCase
+        sid = s.get('cardId') or s.get('studentId')
+        if not sid:
+            continue
+        sid = str(sid)
+        stype = s.get('scanType')
+        if stype == 'entry':
+            counts[sid] = counts.get(sid, 0) + 1
+        elif stype == 'exit' and counts.get(sid):
+            counts[sid] -= 1
+
+
+def onboard_ids(uid, bus_id, trip):
+    """Return the IDs currently on board for a trip, in first-boarded order."""
+    scans = trip.get('scans')
+    if isinstance(scans, dict):
+        # Map keys come back sorted, so new scans are not guaranteed to be at the end:
+        # replay the whole map (still a single linear pass)
+        counts = {}
+        _apply(counts, scans.values())
+        return [sid for sid, n in counts.items() if n > 0]
+    if not isinstance(scans, list):
+        return []
+
+    key = (uid, bus_id, trip.get('id'))
+    with _lock:
+        cached = _trips.get(key)
+    if cached and cached[0] <= len(scans):
+        seen, counts = cached[0], dict(cached[1])
+    else:
+        seen, counts = 0, {}
+
+    _apply(counts, scans[seen:])
+
+    with _lock:
+        _trips[key] = (len(scans), counts)
+        _trips.move_to_end(key)
+        while len(_trips) > MAX_TRIPS:
+            _trips.popitem(last=False)
+
+    return [sid for sid, n in counts.items() if n > 0]
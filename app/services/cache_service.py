@@ -0,0 +1,119 @@
+import copy
+import threading
+import time
+
+from flask import current_app
+from app.services.firebase_service import select_map
+from app import repositories
+from app.services import metrics, request_memo
+
+# Reference collections that are read on almost every page but change rarely.
+# Cached per organization: {(uid, collection): (expires_at, [docs])}
+# plus ID -> field lookups: {(uid, collection, field): (expires_at, {id: value})}
+# invalidate() bumps a per-collection generation, so a read that started
+# before the invalidation does not put its (possibly stale) result back.
+CACHED_COLLECTIONS = ('buses', 'routes', 'drivers', 'stops')
+DEFAULT_TTL = 60  # seconds
+
+_cache = {}
+_generations = {}  # (uid, collection) -> invalidation count
+_lock = threading.Lock()
+
+
+def _ttl():
+    try:
+        return current_app.config.get('REFERENCE_CACHE_TTL', DEFAULT_TTL)
+    except RuntimeError:
+        # Outside of an app context (scripts), fall back to the default
+        return DEFAULT_TTL
+
+
+def _load(uid, collection):
+    ref = repositories.for_collection(uid, collection).ref
+    key = f'organizations/{uid}/{collection}'
+    if collection == 'stops':
+        ref = ref.order_by('stop_name')
+        key += '?order_by=stop_name'
+    docs = []
+    for doc in request_memo.stream(ref, key):
+        d = doc.to_dict()
+        d['id'] = doc.id
+        docs.append(d)
+    return docs
+
+
+def get_collection(uid, collection):
+    """Return the cached documents of an org reference collection.
+
+    Each document is a dict with its Firestore ID under 'id'. Callers get
+    their own copy, so mutating the result never leaks into the cache.
+    """
+    key = (uid, collection)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        generation = _generations.get(key, 0)
+    hit = bool(entry and entry[0] > now)
+    metrics.record_cache('reference', hit)
+    if hit:
+        return copy.deepcopy(entry[1])
+
+    docs = _load(uid, collection)
+    with _lock:
+        if _generations.get(key, 0) == generation:
+            _cache[key] = (now + _ttl(), docs)
+    return copy.deepcopy(docs)
+
+
+def get_field_map(uid, collection, field):
+    """Return {doc_id: value} for one field of an org reference collection.
+
+    For pages that only need names for IDs: served from the full cached
+    documents when they are fresh, otherwise read with a select() projection.
+    """
+    key = (uid, collection, field)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        full = _cache.get((uid, collection))
+        generation = _generations.get((uid, collection), 0)
+    if entry and entry[0] > now:
+        metrics.record_cache('field_map', True)
+        return dict(entry[1])
+    if full and full[0] > now:
+        metrics.record_cache('field_map', True)
+        return {d['id']: d.get(field) for d in full[1]}
+    metrics.record_cache('field_map', False)
+
+    ref = repositories.for_collection(uid, collection).ref
+    values = select_map(ref, field)
+    with _lock:
+        if _generations.get((uid, collection), 0) == generation:
+            _cache[key] = (now + _ttl(), values)
+    return dict(values)
+
+
+def get_buses(uid):
+    return get_collection(uid, 'buses')
+
+
+def get_routes(uid):
+    return get_collection(uid, 'routes')
+
+
+def get_drivers(uid):
+    return get_collection(uid, 'drivers')
+
+
+def get_stops(uid):
+    return get_collection(uid, 'stops')
+
+
+def invalidate(uid, *collections):
+    """Drop cached collections for an org (all of them if none are given)."""
+    collections = set(collections or CACHED_COLLECTIONS)
+    with _lock:
+        for collection in collections:
+            _generations[(uid, collection)] = _generations.get((uid, collection), 0) + 1
+        for key in [k for k in _cache if k[0] == uid and k[1] in collections]:
+            del _cache[key]
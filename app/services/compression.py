@@ -0,0 +1,59 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# App-wide response compression for rendered pages and JSON APIs.
+# Streamed responses (the live-trips SSE feed, exports, send_file) are left
+# alone: buffering them to compress would delay every event.
+DEFAULT_MIN_SIZE = 1024  # bytes; smaller bodies are not worth the CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # fast enough to run per request
+COMPRESSIBLE_TYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml'
+}
+
+
+def _encode(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def init_compression(app):
+    encodings = ['br', 'gzip'] if brotli else ['gzip']
+
+    @app.after_request
+    def compress_response(response):
+        if (response.mimetype not in COMPRESSIBLE_TYPES
+                or response.is_streamed or response.direct_passthrough
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = request.accept_encodings.best_match(encodings)
+        if not encoding:
+            return response
+        data = response.get_data()
+        if len(data) < app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE):
+            return response
+
+        response.set_data(_encode(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # The compressed body is a different representation and needs its own ETag
+            response.set_etag(f'{etag}-{encoding}', weak=weak)
+        return response
@@ -0,0 +1,72 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from app.services import instrumentation, request_memo
+
+# Shared thread pools for issuing independent Firestore reads in parallel.
+# The Firestore client is thread-safe, and the calls are network-bound, so a
+# page's latency becomes roughly that of its slowest read. Page requests and
+# bulk background work (fee reset, export paging, photo jobs) get separate
+# pools, so a long job cannot queue ahead of a page's reads.
+DEFAULT_WORKERS = 16
+DEFAULT_BACKGROUND_WORKERS = 8
+
+_executors = {}
+_lock = threading.Lock()
+
+POOLS = {
+    # name: (config key, default size)
+    'fanout': ('FANOUT_WORKERS', DEFAULT_WORKERS),
+    'background': ('BACKGROUND_FANOUT_WORKERS', DEFAULT_BACKGROUND_WORKERS),
+}
+
+
+def _get_executor(pool='fanout'):
+    with _lock:
+        if pool not in _executors:
+            key, default = POOLS[pool]
+            workers = current_app.config.get(key, default)
+            _executors[pool] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=pool)
+        return _executors[pool]
+
+
+def gather(**calls):
+    """Run the given zero-argument callables concurrently and return {name: result}.
+
+    Each call runs inside the current app context (sharing the request's read
+    memo and backend call stats). If any call raises, the exception of the
+    first failed call in argument order is re-raised after all of them have
+    finished.
+    """
+    return _gather('fanout', calls)
+
+
+def gather_background(**calls):
+    """gather() on the background pool, for jobs and long exports."""
+    return _gather('background', calls)
+
+
+def _gather(pool, calls):
+    app = current_app._get_current_object()
+    memo = request_memo.current()
+    stats = instrumentation.current()
+
+    def run_in_app(fn):
+        with app.app_context():
+            request_memo.adopt(memo)
+            instrumentation.adopt(stats)
+            return fn()
+
+    executor = _get_executor(pool)
+    futures = {name: executor.submit(run_in_app, fn) for name, fn in calls.items()}
+    results = {}
+    error = None
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            error = error or e
+    if error:
+        raise error
+    return results
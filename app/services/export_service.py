@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from app import repositories
+from app.services import concurrency
+
+# Streaming exports of org data. Students are read a page at a time (ordered by
+# document ID) and each page's subcollections are fetched in parallel, so only
+# one page is ever held in memory regardless of org size. Rows are encoded into
+# chunks that the response generator yields as they are produced.
+PAGE_SIZE = 200
+ROWS_PER_CHUNK = 100
+
+DATASETS = {
+    'students': {
+        'children': None,
+        'fields': [
+            'id', 'roll_number', 'full_name', 'parent_name', 'parent_phone', 'student_phone',
+            'email', 'dob', 'address', 'batch', 'bus_id', 'bus_number', 'route_id', 'route_name',
+            'bus_stop', 'payment_type', 'fee_amount', 'paid', 'due', 'can_travel',
+            'last_fee_reset_date', 'created_at'
+        ]
+    },
+    'payments': {
+        'children': repositories.payments,
+        'fields': ['student_id', 'id', 'amount', 'date', 'mode', 'reference_id', 'archived']
+    },
+    'attendance': {
+        'children': repositories.attendance,
+        'fields': [
+            'student_id', 'id', 'date', 'trip_type', 'status', 'bus_id', 'start_point',
+            'end_point', 'boarded_time', 'dropped_time', 'timestamp'
+        ]
+    }
+}
+
+
+def iter_pages(query, page_size=PAGE_SIZE):
+    """Yield lists of up to page_size documents, paging by document ID."""
+    last = None
+    while True:
+        page_query = query.order_by('__name__').limit(page_size)
+        if last is not None:
+            page_query = page_query.start_after(last)
+        docs = list(page_query.stream())
+        if docs:
+            yield docs
+        if len(docs) < page_size:
+            return
+        last = docs[-1]
+
+
+def iter_records(uid, dataset):
+    """Yield one dict per exported document for the given dataset."""
+    children_of = DATASETS[dataset]['children']  # repository factory (uid, student_id)
+    students_ref = repositories.students(uid).ref
+
+    for students in iter_pages(students_ref):
+        if not children_of:
+            for doc in students:
+                yield {'id': doc.id, **(doc.to_dict() or {})}
+            continue
+
+        # One subcollection read per student on this page, issued in parallel
+        children = concurrency.gather_background(**{
+            s.id: (lambda sid=s.id: list(children_of(uid, sid).ref.stream()))
+            for s in students
+        })
+        for s in students:
+            for doc in children[s.id]:
+                yield {'student_id': s.id, 'id': doc.id, **(doc.to_dict() or {})}
+
+
+def _plain(value):
+    # Firestore timestamps come back as datetime subclasses
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def to_csv(records, fields):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction='ignore')
+    writer.writeheader()
+    for n, record in enumerate(records, 1):
+        writer.writerow({f: _plain(record.get(f, '')) for f in fields})
+        if n % ROWS_PER_CHUNK == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def to_ndjson(records):
+    lines = []
+    for record in records:
+        lines.append(json.dumps(record, default=_json_default))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export(uid, dataset, fmt):
+    """Return a generator of text chunks for dataset in 'csv' or 'ndjson' format."""
+    records = iter_records(uid, dataset)
+    if fmt == 'ndjson':
+        return to_ndjson(records)
+    return to_csv(records, DATASETS[dataset]['fields'])
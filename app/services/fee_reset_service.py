@@ -0,0 +1,127 @@
+from datetime import datetime
+
+from app.services.firebase_service import get_db, count_documents
+from app import repositories
+from app.services import concurrency, job_service
+
+# Academic-year fee reset, run as a background job instead of inside the request.
+# Progress and a resume cursor are checkpointed on the job record
+# (organizations/{uid}/jobs/fee_reset) after every page, so a retried or
+# restarted run picks up where it stopped.
+JOB_ID = 'fee_reset'
+PAGE_SIZE = 200
+WRITE_ATTEMPTS = 5
+# DEADLINE_EXCEEDED, RESOURCE_EXHAUSTED, ABORTED, INTERNAL, UNAVAILABLE
+RETRYABLE_CODES = {4, 8, 10, 13, 14}
+
+
+def build_fee_map(uid):
+    # Fee Lookup Map: RouteName -> StopName -> Fee
+    # Read fresh: this process's reference cache may predate a fee change
+    # made on another worker, and these fees are written to every student
+    fee_map = {} # {'Route A': {'Stop 1': 5000, 'Stop 2': 6000}}
+    for r_doc in repositories.routes(uid).ref.stream():
+        r_data = r_doc.to_dict()
+        r_name = r_data.get('route_name')
+        if r_name:
+            # stops is a list of dicts: [{'name': 'Stop1', 'fee': '5000'}, ...]
+            stop_fees = {}
+            for s in r_data.get('stops', []):
+                s_name = s.get('name')
+                try:
+                    stop_fees[s_name] = float(s.get('fee', 0))
+                except (TypeError, ValueError):
+                    stop_fees[s_name] = 0.0
+            fee_map[r_name] = stop_fees
+    return fee_map
+
+
+def start(uid):
+    """Start the fee reset for an org, or resume an interrupted one. Returns the job record."""
+    job = job_service.get_job(uid, JOB_ID)
+    if job_service.is_active(job):
+        return job
+
+    if job and job.get('status') != 'completed' and job.get('cursor'):
+        # Interrupted or failed: keep processed/cursor/reset_date and carry on
+        fields = {}
+    else:
+        students_ref = repositories.students(uid).ref
+        fields = {
+            'processed': 0,
+            'total': count_documents(students_ref),
+            'cursor': None,
+            'reset_date': datetime.now().strftime('%Y-%m-%d')
+        }
+    return job_service.enqueue(uid, 'fee_reset', job_id=JOB_ID, fields=fields)
+
+
+@job_service.register('fee_reset', max_attempts=5)
+def run_fee_reset(job):
+    uid = job.uid
+    db = get_db()
+    students_ref = repositories.students(uid).ref
+    fee_map = build_fee_map(uid)
+    processed = job.data.get('processed', 0)
+    cursor = job.data.get('cursor')
+
+    while True:
+        query = students_ref.order_by('__name__').limit(PAGE_SIZE)
+        if cursor:
+            query = query.start_after({'__name__': cursor})
+        students = list(query.stream())
+        if not students:
+            break
+
+        # Read every student's payments subcollection in parallel
+        payments = concurrency.gather_background(**{
+            s.id: (lambda sid=s.id: list(repositories.payments(uid, sid).ref.stream()))
+            for s in students
+        })
+
+        # BulkWriter's default handler gives up on a write silently and close()
+        # does not raise, so collect what failed and stop before checkpointing
+        failures = []
+
+        def on_write_error(failure, _writer, failures=failures):
+            if failure.code in RETRYABLE_CODES and failure.attempts < WRITE_ATTEMPTS:
+                return True
+            failures.append(failure)
+            return False
+
+        writer = db.bulk_writer()
+        writer.on_write_error(on_write_error)
+        for student in students:
+            student_data = student.to_dict()
+
+            # Lookup current fee
+            route_name = student_data.get('route_name')
+            bus_stop = student_data.get('bus_stop')
+            current_fee = float(student_data.get('fee_amount', 0)) # Default to existing
+            if route_name in fee_map and bus_stop in fee_map[route_name]:
+                current_fee = fee_map[route_name][bus_stop]
+
+            writer.update(student.reference, {
+                'paid': 0,
+                'due': current_fee,     # Reset due to the CURRENT fee amount
+                'fee_amount': current_fee, # Update fee amount in case it changed
+                'can_travel': False,
+                'last_fee_reset_date': job.data['reset_date']
+            })
+
+            # Archive existing payments (history preserved)
+            for p_doc in payments[student.id]:
+                if not (p_doc.to_dict() or {}).get('archived'):
+                    writer.update(p_doc.reference, {'archived': True})
+        writer.close()
+        if failures:
+            first = failures[0]
+            raise RuntimeError(f'{len(failures)} fee reset writes failed, e.g. '
+                               f'{first.operation.reference.path}: {first.message}')
+
+        # Checkpoint: this page is committed, resume after its last student
+        processed += len(students)
+        cursor = students[-1].id
+        job.update(processed=processed, cursor=cursor)
+
+    return {'message': f'Fee cycle reset for {processed} students. History preserved (archived).'}
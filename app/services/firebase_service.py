@@ -7,6 +7,12 @@ import json
 
 def init_firebase(app):
     global db
+    if app.config.get('DATA_BACKEND') == 'memory':
+        # Offline: in-memory Firestore stand-in (RTDB, Storage and Auth are unavailable)
+        from app.repositories.memory import MemoryClient
+        db = MemoryClient()
+        return
+
     if not firebase_admin._apps:
         creds_config = app.config['FIREBASE_CREDENTIALS']
         
@@ -39,3 +45,27 @@ def get_db_rtdb():
 
 def get_db():
     return db
+
+def count_documents(query):
+    # Server-side count() aggregation: billed per 1000 index entries, not per document
+    results = query.count().get()
+    return int(results[0][0].value)
+
+def normalize_phone(phone_number):
+    # Returns (E.164 phone number, None) or (None, error message)
+    phone_number = str(phone_number).replace(" ", "").replace("-", "")
+
+    # Indian number handling
+    if len(phone_number) == 11 and phone_number.startswith("0"):
+        phone_number = phone_number[1:]
+
+    if len(phone_number) == 10:
+        phone_number = "+91" + phone_number
+
+    if not phone_number.startswith("+"):
+        return None, "Invalid phone number format"
+    return phone_number, None
+
+def select_map(query, field, default=None):
+    # {doc_id: value of one field}, downloading only that field (select() projection)
+    return {doc.id: (doc.to_dict() or {}).get(field, default) for doc in query.select([field]).stream()}
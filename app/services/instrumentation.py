@@ -0,0 +1,176 @@
+import functools
+import threading
+import time
+
+from flask import g, has_app_context, has_request_context, request
+
+# Per-request accounting of backend round trips. The Firestore, RTDB and
+# Storage client classes are wrapped once at startup; every call made while a
+# request is being handled (including from concurrency.gather workers) adds
+# its call count, documents read and time to that request's stats. The totals
+# go out in a Server-Timing header and a one-line log summary.
+SERVICES = ('firestore', 'rtdb', 'storage')
+
+_local = threading.local()  # depth guard: nested client calls count once
+_installed = False
+
+
+class RequestStats:
+    def __init__(self, endpoint=None):
+        self.endpoint = endpoint
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.calls = dict.fromkeys(SERVICES, 0)
+        self.docs = dict.fromkeys(SERVICES, 0)
+        self.seconds = dict.fromkeys(SERVICES, 0.0)
+
+    def add(self, service, seconds, calls=0, docs=0):
+        with self.lock:
+            self.calls[service] += calls
+            self.docs[service] += docs
+            self.seconds[service] += seconds
+
+    def server_timing(self):
+        parts = []
+        for s in SERVICES:
+            if self.calls[s]:
+                parts.append(f'{s};dur={self.seconds[s] * 1000:.1f};desc="{self.calls[s]} calls, {self.docs[s]} docs"')
+        parts.append(f'app;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(parts)
+
+    def summary(self):
+        return ' | '.join(f'{s} {self.calls[s]} calls {self.docs[s]} docs {self.seconds[s] * 1000:.0f}ms'
+                          for s in SERVICES if self.calls[s])
+
+
+def current():
+    """Stats of the request being handled, or None (scripts, background jobs)."""
+    if not has_app_context():
+        return None
+    stats = g.get('_backend_stats')
+    if stats is None and has_request_context():
+        stats = g._backend_stats = RequestStats(request.endpoint)
+    return stats
+
+
+def adopt(stats):
+    # Attribute calls made in a child app context to the parent request
+    if stats is not None:
+        g._backend_stats = stats
+
+
+def _count_docs(result):
+    if isinstance(result, list):
+        return len(result)
+    exists = getattr(result, 'exists', None)
+    if exists is not None:
+        return 1 if exists else 0
+    return 0
+
+
+def _timed_iter(stats, service, it):
+    # Streams are lazy: time and count each document as it is pulled
+    while True:
+        _local.depth = getattr(_local, 'depth', 0) + 1
+        start = time.perf_counter()
+        try:
+            item = next(it)
+        except StopIteration:
+            stats.add(service, time.perf_counter() - start)
+            return
+        finally:
+            _local.depth -= 1
+        stats.add(service, time.perf_counter() - start, docs=1)
+        yield item
+
+
+def _wrap(cls, name, service, streams=False, reads=True):
+    original = getattr(cls, name, None)
+    if original is None or getattr(original, '_instrumented', False):
+        return
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        stats = current()
+        if stats is None or getattr(_local, 'depth', 0):
+            return original(*args, **kwargs)
+        _local.depth = getattr(_local, 'depth', 0) + 1
+        start = time.perf_counter()
+        try:
+            result = original(*args, **kwargs)
+        finally:
+            _local.depth -= 1
+        elapsed = time.perf_counter() - start
+        if streams:
+            stats.add(service, elapsed, calls=1)
+            return _timed_iter(stats, service, iter(result))
+        stats.add(service, elapsed, calls=1, docs=_count_docs(result) if reads else 0)
+        return result
+
+    wrapper._instrumented = True
+    setattr(cls, name, wrapper)
+
+
+def install():
+    """Wrap the backend client classes (idempotent)."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from google.cloud.firestore_v1.aggregation import AggregationQuery
+    from google.cloud.firestore_v1.batch import WriteBatch
+    from google.cloud.firestore_v1.client import Client
+    from google.cloud.firestore_v1.collection import CollectionReference
+    from google.cloud.firestore_v1.document import DocumentReference
+    from google.cloud.firestore_v1.query import Query
+    from google.cloud.storage.blob import Blob
+    from firebase_admin import db as rtdb
+
+    _wrap(DocumentReference, 'get', 'firestore')
+    for name in ('create', 'set', 'update', 'delete'):
+        _wrap(DocumentReference, name, 'firestore', reads=False)
+    for cls in (Query, CollectionReference):
+        _wrap(cls, 'get', 'firestore')
+        _wrap(cls, 'stream', 'firestore', streams=True)
+    _wrap(Client, 'get_all', 'firestore', streams=True)
+    _wrap(WriteBatch, 'commit', 'firestore', reads=False)
+    _wrap(AggregationQuery, 'get', 'firestore', reads=False)
+
+    # DATA_BACKEND=memory: count the in-memory client the same way, so load
+    # tests report the round trips the Firestore client would make
+    from app.repositories import memory
+    _wrap(memory.MemoryDocumentReference, 'get', 'firestore')
+    for name in ('create', 'set', 'update', 'delete'):
+        _wrap(memory.MemoryDocumentReference, name, 'firestore', reads=False)
+    _wrap(memory.MemoryQuery, 'get', 'firestore')
+    _wrap(memory.MemoryQuery, 'stream', 'firestore', streams=True)
+    _wrap(memory.MemoryClient, 'get_all', 'firestore', streams=True)
+    _wrap(memory.MemoryWriteBatch, 'commit', 'firestore', reads=False)
+    _wrap(memory.MemoryAggregationQuery, 'get', 'firestore', reads=False)
+
+    for name in ('get', 'set', 'update', 'push', 'delete', 'transaction'):
+        _wrap(rtdb.Reference, name, 'rtdb')
+    _wrap(rtdb.Query, 'get', 'rtdb')
+
+    for name in ('upload_from_string', 'upload_from_file', 'make_public', 'exists',
+                 'download_as_bytes', 'reload', 'delete'):
+        _wrap(Blob, name, 'storage')
+
+
+def init_instrumentation(app):
+    install()
+
+    @app.after_request
+    def add_server_timing(response):
+        stats = g.get('_backend_stats')
+        if stats is not None:
+            response.headers['Server-Timing'] = stats.server_timing()
+        return response
+
+    @app.teardown_request
+    def log_backend_calls(exc=None):
+        stats = g.get('_backend_stats')
+        if stats is not None and any(stats.calls.values()):
+            elapsed = (time.perf_counter() - stats.started) * 1000
+            print(f"[backend] {request.method} {request.path} {elapsed:.0f}ms | {stats.summary()}")
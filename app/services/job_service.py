@@ -0,0 +1,266 @@
+import queue
+import threading
+import time
+import uuid
+
+from flask import current_app
+from firebase_admin import firestore
+from google.api_core import exceptions
+from app import repositories
+from app.services.firebase_service import get_db
+
+# In-process background jobs for long administrative operations.
+# Job records live in organizations/{uid}/jobs/{job_id}; a small pool of worker
+# threads per process drains a local queue, so no external broker is needed.
+# Handlers get a Job and report progress with job.update(...); a handler that
+# raises is retried with backoff until max_attempts is reached (JobFailed
+# fails it at once, for errors a retry cannot fix).
+# While a process holds a job (queued, waiting to retry or running) it stamps
+# the record's heartbeat; a record whose heartbeat goes stale was lost with its
+# process. The sweep at startup re-queues such queued/retrying jobs, and runs
+# an interrupted (running) one again as a new attempt, or marks it failed when
+# it has no attempts left. Handlers must therefore be safe to repeat.
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 5  # seconds, doubled per attempt
+STALE_AFTER = 120  # seconds without an update before a queued/retrying/running job counts as lost
+HEARTBEAT_INTERVAL = STALE_AFTER / 4
+TERMINAL = ('completed', 'failed')
+
+_handlers = {}
+_queue = queue.Queue()
+_workers = []
+_held = set()  # (uid, job_id) this process has queued, scheduled for retry or is running
+_lock = threading.Lock()
+
+
+class JobFailed(Exception):
+    """Raised by a handler to fail the job without retrying."""
+
+
+class Job:
+    def __init__(self, uid, job_id, data):
+        self.uid = uid
+        self.id = job_id
+        self.data = data
+        self.ref = job_ref(uid, job_id)
+
+    @property
+    def params(self):
+        return self.data.get('params') or {}
+
+    def update(self, **fields):
+        fields['heartbeat'] = time.time()
+        self.data.update(fields)
+        self.ref.update(fields)
+
+
+def job_ref(uid, job_id):
+    return repositories.jobs(uid).doc(job_id)
+
+
+def register(kind, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Decorator registering a handler(job) for a job kind."""
+    def decorator(fn):
+        _handlers[kind] = (fn, max_attempts)
+        return fn
+    return decorator
+
+
+def is_active(data):
+    return bool(data) and data.get('status') in ('queued', 'running', 'retrying') \
+        and time.time() - data.get('heartbeat', 0) <= STALE_AFTER
+
+
+def get_job(uid, job_id):
+    snap = job_ref(uid, job_id).get()
+    if not snap.exists:
+        return None
+    data = snap.to_dict()
+    data['id'] = snap.id
+    return data
+
+
+def enqueue(uid, kind, params=None, job_id=None, fields=None):
+    """Create (or re-queue) a job record and hand it to the local workers.
+
+    With a fixed job_id, an already active job is returned instead of starting
+    a second one. Extra fields are stored on the record for the handler.
+    """
+    if kind not in _handlers:
+        raise ValueError(f'Unknown job kind: {kind}')
+    job_id = job_id or uuid.uuid4().hex
+    ref = job_ref(uid, job_id)
+
+    with _lock:
+        held = (uid, job_id) in _held
+    if held:
+        return get_job(uid, job_id)
+
+    data = {
+        'kind': kind,
+        'status': 'queued',
+        'params': params or {},
+        'attempts': 0,
+        'max_attempts': _handlers[kind][1],
+        'error': '',
+        'result': None,
+        'created_at': firestore.SERVER_TIMESTAMP,
+        'heartbeat': time.time()
+    }
+    data.update(fields or {})
+    try:
+        ref.create(data)
+    except exceptions.AlreadyExists:
+        # Re-queue a finished or interrupted run (merge keeps e.g. a resume
+        # cursor), unless another request or process holds it right now
+        if not _claim(ref, data):
+            return get_job(uid, job_id)
+
+    _submit(uid, job_id)
+    return get_job(uid, job_id)
+
+
+def _claim(ref, fields, statuses=None):
+    """Write fields to an existing job unless it is active; False if it is (or is gone).
+
+    With statuses, only a record in one of those statuses is claimed.
+    """
+    @firestore.transactional
+    def run(transaction):
+        snap = ref.get(transaction=transaction)
+        data = snap.to_dict() if snap.exists else None
+        if data is None or is_active(data) or (statuses and data.get('status') not in statuses):
+            return False
+        transaction.set(ref, fields, merge=True)
+        return True
+
+    return run(get_db().transaction())
+
+
+def _submit(uid, job_id):
+    with _lock:
+        _held.add((uid, job_id))
+    _ensure_workers()
+    _queue.put((uid, job_id))
+
+
+def recover_stale(app):
+    """Pick up jobs whose process went away (restart, deploy, crash).
+
+    Queued/retrying jobs are re-queued, e.g. an auth_delete (random job ID, so
+    nobody enqueues it again) that was still waiting when its worker restarted.
+    A job interrupted while running is re-queued as a new attempt, or marked
+    failed if it has used all of its attempts.
+    """
+    statuses = ('queued', 'running', 'retrying')
+    with app.app_context():
+        query = repositories.all_jobs().where('status', 'in', list(statuses))
+        for snap in query.stream():
+            data = snap.to_dict()
+            if is_active(data) or data.get('kind') not in _handlers:
+                continue
+            uid = snap.reference.parent.parent.id
+            fields = {'heartbeat': time.time()}
+            exhausted = False
+            if data.get('status') == 'running':
+                max_attempts = data.get('max_attempts', _handlers[data['kind']][1])
+                exhausted = data.get('attempts', 0) >= max_attempts
+                fields.update(status='failed' if exhausted else 'retrying',
+                              error='Interrupted: the worker running this job stopped')
+            if not _claim(snap.reference, fields, statuses=statuses):
+                continue
+            if exhausted:
+                print(f"Marked interrupted job {data['kind']} failed ({uid}/{snap.id})")
+                continue
+            print(f"Re-queued stale job {data['kind']} ({uid}/{snap.id})")
+            _submit(uid, snap.id)
+
+
+def init_jobs(app):
+    # Runs in the background: startup should not wait on a collection group query
+    def sweep():
+        try:
+            recover_stale(app)
+        except Exception as e:
+            print(f"Stale job sweep failed: {e}")
+
+    if app.config.get('JOB_RECOVERY', True):
+        threading.Thread(target=sweep, name='job-recovery', daemon=True).start()
+
+
+def _ensure_workers():
+    app = current_app._get_current_object()
+    with _lock:
+        if _workers:
+            return
+        for i in range(app.config.get('JOB_WORKERS', DEFAULT_WORKERS)):
+            t = threading.Thread(target=_worker, args=(app,), name=f'job-worker-{i}', daemon=True)
+            t.start()
+            _workers.append(t)
+        t = threading.Thread(target=_heartbeat, args=(app,), name='job-heartbeat', daemon=True)
+        t.start()
+        _workers.append(t)
+
+
+def _heartbeat(app):
+    # Keep jobs waiting in the local queue (or for a retry) from looking
+    # interrupted, so they are not enqueued a second time elsewhere
+    while True:
+        time.sleep(HEARTBEAT_INTERVAL)
+        with _lock:
+            held = list(_held)
+        with app.app_context():
+            for uid, job_id in held:
+                try:
+                    job_ref(uid, job_id).update({'heartbeat': time.time()})
+                except Exception as e:
+                    print(f"Job heartbeat error ({uid}/{job_id}): {e}")
+
+
+def _worker(app):
+    while True:
+        uid, job_id = _queue.get()
+        retrying = False
+        try:
+            with app.app_context():
+                retrying = _run(uid, job_id)
+        except Exception as e:
+            print(f"Job worker error ({uid}/{job_id}): {e}")
+        finally:
+            if not retrying:
+                with _lock:
+                    _held.discard((uid, job_id))
+            _queue.task_done()
+
+
+def _run(uid, job_id):
+    """Run one attempt; True when a retry has been scheduled."""
+    data = get_job(uid, job_id)
+    if not data or data.get('status') in TERMINAL:
+        return False
+    handler, max_attempts = _handlers[data['kind']]
+    job = Job(uid, job_id, data)
+    attempts = data.get('attempts', 0) + 1
+    job.update(status='running', attempts=attempts, error='')
+
+    try:
+        result = handler(job)
+    except JobFailed as e:
+        print(f"Job {data['kind']} failed ({uid}/{job_id}): {e}")
+        job.update(status='failed', error=str(e))
+        return False
+    except Exception as e:
+        print(f"Job {data['kind']} failed ({uid}/{job_id}, attempt {attempts}): {e}")
+        if attempts < max_attempts:
+            job.update(status='retrying', error=str(e))
+            delay = RETRY_BACKOFF * (2 ** (attempts - 1))
+            timer = threading.Timer(delay, _queue.put, args=((uid, job_id),))
+            timer.daemon = True
+            timer.start()
+            return True
+        job.update(status='failed', error=str(e))
+        return False
+
+    job.update(status='completed', result=result)
+    return False
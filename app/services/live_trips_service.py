@@ -0,0 +1,133 @@
+import queue
+import threading
+
+from app import repositories
+from app.services import cache_service
+
+# One Firestore listener per organization, shared by every open dashboard tab.
+# Subscribers receive ('snapshot', [bus, ...]) once, then ('update', {...}) events
+# carrying only the buses whose live fields changed.
+LIVE_FIELDS = ('bus_number', 'registration_no', 'route_name', 'trip_status', 'on_board_count', 'capacity')
+# Each open stream holds a worker thread for its whole lifetime (gthread), so
+# only this many may be open per process; the rest get a 503 and poll instead
+DEFAULT_STREAM_LIMIT = 4
+STREAM_MAX_SECONDS = 300  # then the browser reconnects, so a slot frees up now and then
+
+_feeds = {}
+_open_streams = 0
+_lock = threading.Lock()
+
+
+def bus_payload(bus_id, bus, route_map):
+    r_id = bus.get('route_id')
+    return {
+        'id': bus_id,
+        'bus_number': bus.get('bus_number', ''),
+        'registration_no': bus.get('registration_no', ''),
+        'route_name': route_map.get(r_id, 'No Route Assigned') if r_id else 'No Route Assigned',
+        'trip_status': bus.get('trip_status', 'Not Started'),
+        'on_board_count': bus.get('on_board_count', 0),
+        'capacity': bus.get('capacity', '-')
+    }
+
+
+class OrgFeed:
+    def __init__(self, uid):
+        self.uid = uid
+        self.buses = {}
+        self.subscribers = set()
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.watch = None
+
+    def start(self):
+        buses_ref = repositories.buses(self.uid).ref
+        self.watch = buses_ref.on_snapshot(self._on_snapshot)
+
+    def stop(self):
+        if self.watch:
+            try:
+                self.watch.unsubscribe()
+            except Exception as e:
+                print(f"Live trips unsubscribe warning ({self.uid}): {e}")
+            self.watch = None
+
+    def _on_snapshot(self, docs, changes, read_time):
+        try:
+            route_map = {rid: name or 'Unknown Route' for rid, name in cache_service.get_field_map(self.uid, 'routes', 'route_name').items()}
+        except Exception as e:
+            print(f"Live trips route lookup failed ({self.uid}): {e}")
+            route_map = {}
+
+        changed = []
+        removed = []
+        with self.lock:
+            for change in changes:
+                bus_id = change.document.id
+                if change.type.name == 'REMOVED':
+                    if self.buses.pop(bus_id, None) is not None:
+                        removed.append(bus_id)
+                    continue
+                payload = bus_payload(bus_id, change.document.to_dict() or {}, route_map)
+                if self.buses.get(bus_id) != payload:
+                    self.buses[bus_id] = payload
+                    changed.append(payload)
+            subscribers = list(self.subscribers)
+            first_snapshot = not self.ready.is_set()
+            self.ready.set()
+
+        if first_snapshot or not (changed or removed):
+            return
+        for q in subscribers:
+            q.put(('update', {'buses': changed, 'removed': removed}))
+
+    def snapshot(self):
+        with self.lock:
+            return sorted(self.buses.values(), key=lambda b: b['id'])
+
+
+def acquire_stream(limit=DEFAULT_STREAM_LIMIT):
+    """Reserve one of the process's stream slots; False when all are taken."""
+    global _open_streams
+    with _lock:
+        if _open_streams >= limit:
+            return False
+        _open_streams += 1
+        return True
+
+
+def release_stream():
+    global _open_streams
+    with _lock:
+        _open_streams = max(0, _open_streams - 1)
+
+
+def subscribe(uid, timeout=10):
+    """Register a subscriber queue for an org, starting its listener if needed."""
+    q = queue.Queue()
+    with _lock:
+        feed = _feeds.get(uid)
+        if feed is None:
+            feed = OrgFeed(uid)
+            feed.start()
+            _feeds[uid] = feed
+        with feed.lock:
+            feed.subscribers.add(q)
+    feed.ready.wait(timeout)
+    q.put(('snapshot', {'buses': feed.snapshot()}))
+    return q
+
+
+def unsubscribe(uid, q):
+    """Drop a subscriber; the org listener is closed with its last subscriber."""
+    with _lock:
+        feed = _feeds.get(uid)
+        if feed is None:
+            return
+        with feed.lock:
+            feed.subscribers.discard(q)
+            idle = not feed.subscribers
+        if idle:
+            del _feeds[uid]
+    if idle:
+        feed.stop()
@@ -0,0 +1,99 @@
+import os
+import time
+
+from flask import Response, g, has_app_context, has_request_context, request
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+except ImportError:  # prometheus_client not installed: metrics are disabled
+    prometheus_client = None
+
+# Prometheus metrics per Flask endpoint, exposed at /metrics.
+# Under gunicorn with several workers, set PROMETHEUS_MULTIPROC_DIR (an empty,
+# writable directory) before start: every worker then writes its samples there
+# and /metrics aggregates all of them, whichever worker serves the scrape
+# (see gunicorn.conf.py for the cleanup hooks).
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+if prometheus_client:
+    REQUESTS = Counter('http_requests_total', 'HTTP requests handled',
+                       ['endpoint', 'method', 'status'])
+    LATENCY = Histogram('http_request_duration_seconds', 'Time to produce the response (headers for streams)',
+                        ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+    IN_PROGRESS = Gauge('http_requests_in_progress', 'Requests currently being handled',
+                        ['endpoint', 'method'], multiprocess_mode='livesum')
+    BACKEND_CALLS = Counter('backend_calls_total', 'Firestore/RTDB/Storage calls made by requests',
+                            ['endpoint', 'service'])
+    BACKEND_DOCS = Counter('backend_documents_read_total', 'Documents read by requests',
+                           ['endpoint', 'service'])
+    BACKEND_SECONDS = Counter('backend_seconds_total', 'Time spent in backend calls by requests',
+                              ['endpoint', 'service'])
+    CACHE_LOOKUPS = Counter('cache_lookups_total', 'In-process cache lookups (hit ratio = hit / all)',
+                            ['endpoint', 'cache', 'result'])
+
+
+def _endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    # concurrency.gather workers carry the request's stats, which know the endpoint
+    stats = g.get('_backend_stats') if has_app_context() else None
+    if stats is not None:
+        return stats.endpoint or 'unmatched'
+    return 'background'
+
+
+def record_cache(cache, hit):
+    """Count a cache hit or miss against the current endpoint."""
+    if prometheus_client:
+        CACHE_LOOKUPS.labels(_endpoint(), cache, 'hit' if hit else 'miss').inc()
+
+
+def _render():
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry)
+
+
+def init_metrics(app):
+    if not prometheus_client:
+        print("prometheus_client not installed: /metrics disabled")
+        return
+
+    @app.before_request
+    def start_request_metrics():
+        g._metrics_start = time.perf_counter()
+        IN_PROGRESS.labels(_endpoint(), request.method).inc()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.get('_metrics_start')
+        if start is not None:
+            endpoint = _endpoint()
+            LATENCY.labels(endpoint, request.method).observe(time.perf_counter() - start)
+            REQUESTS.labels(endpoint, request.method, str(response.status_code)).inc()
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(exc=None):
+        if g.get('_metrics_start') is None:
+            return
+        endpoint = _endpoint()
+        IN_PROGRESS.labels(endpoint, request.method).dec()
+        stats = g.get('_backend_stats')
+        if stats is not None:
+            for service, calls in stats.calls.items():
+                if calls:
+                    BACKEND_CALLS.labels(endpoint, service).inc(calls)
+                    BACKEND_DOCS.labels(endpoint, service).inc(stats.docs[service])
+                    BACKEND_SECONDS.labels(endpoint, service).inc(stats.seconds[service])
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config.get('METRICS_TOKEN')
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Unauthorized', status=401)
+        return Response(_render(), content_type=prometheus_client.CONTENT_TYPE_LATEST)
@@ -0,0 +1,145 @@
+import hashlib
+import io
+import os
+import tempfile
+
+from app.services.firebase_service import get_bucket
+from app import repositories
+from app.services import cache_service, concurrency, job_service
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow not installed: photos are stored as uploaded
+    Image = None
+
+# Profile photos are processed off the request path. The request only spools
+# the upload to a temp file and queues a 'photo_upload' job; the job fixes EXIF
+# orientation, renders the variants below as JPEGs, uploads them in parallel
+# and patches their URLs onto the student/driver document.
+# Objects are named by the SHA-256 of the uploaded bytes, so re-submitting the
+# same photo reuses the stored variants instead of writing new blobs, and the
+# URLs never change content, which lets browsers cache them indefinitely.
+VARIANTS = {
+    'profile_photo_url': 1024,  # resized original, detail pages
+    'thumbnail_url': 160        # list cards and avatars (80px at 2x)
+}
+JPEG_QUALITY = 85
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def queue_upload(uid, collection, doc_id, file):
+    """Spool an uploaded photo and queue it for processing. Returns the job id, or None.
+
+    Called after the record is saved, so a failure here is logged and the
+    record is kept without a photo instead of failing the request.
+    """
+    if not file or not file.filename:
+        return None
+    path = None
+    try:
+        fd, path = tempfile.mkstemp(prefix='photo-', suffix=os.path.splitext(file.filename)[1])
+        with os.fdopen(fd, 'wb') as out:
+            file.save(out)
+        job = job_service.enqueue(uid, 'photo_upload', params={
+            'collection': collection,
+            'doc_id': doc_id,
+            'path': path,
+            'filename': file.filename,
+            'content_type': file.content_type or 'application/octet-stream'
+        })
+        return job['id']
+    except Exception as e:
+        print(f"Photo upload not queued ({collection}/{doc_id}): {e}")
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return None
+
+
+def render_variants(raw):
+    """Return {field: jpeg_bytes} with one resized, upright JPEG per variant."""
+    with Image.open(io.BytesIO(raw)) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        variants = {}
+        for field, size in VARIANTS.items():
+            copy = img.copy()
+            copy.thumbnail((size, size), Image.LANCZOS)
+            out = io.BytesIO()
+            copy.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            variants[field] = out.getvalue()
+        return variants
+
+
+def _stored_url(name):
+    blob = get_bucket().blob(name)
+    return blob.public_url if blob.exists() else None
+
+
+def _upload(name, data, content_type):
+    blob = get_bucket().blob(name)
+    blob.cache_control = CACHE_CONTROL
+    blob.upload_from_string(data, content_type=content_type)
+    blob.make_public()
+    return blob.public_url
+
+
+@job_service.register('photo_upload')
+def process_upload(job):
+    uid = job.uid
+    params = job.params
+    path = params['path']
+    if not os.path.exists(path):
+        # Spooled file is gone (process restarted): nothing left to retry
+        return {'skipped': 'upload no longer available'}
+
+    retrying = False
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+        base = f"{params['collection']}/{uid}/{hashlib.sha256(raw).hexdigest()}"
+        if Image is None:
+            name = f"{base}{os.path.splitext(params['filename'])[1].lower()}"
+            url = _stored_url(name) or _upload(name, raw, params['content_type'])
+            urls = {field: url for field in VARIANTS}
+        else:
+            names = {field: f"{base}_{size}.jpg" for field, size in VARIANTS.items()}
+            urls = concurrency.gather_background(**{field: (lambda name=name: _stored_url(name)) for field, name in names.items()})
+            missing = [field for field, url in urls.items() if not url]
+            if missing:
+                # Upload the missing variants in parallel
+                try:
+                    variants = render_variants(raw)
+                except Image.UnidentifiedImageError:
+                    # Not an image Pillow can read: retrying won't change that
+                    raise job_service.JobFailed(f"Unsupported image file: {params['filename']}")
+                urls.update(concurrency.gather_background(**{
+                    field: (lambda name=names[field], data=variants[field]: _upload(name, data, 'image/jpeg'))
+                    for field in missing
+                }))
+    except job_service.JobFailed:
+        raise
+    except Exception:
+        # Keep the spooled file only for a retry that will read it again
+        retrying = job.data.get('attempts', 0) < job.data.get('max_attempts', job_service.DEFAULT_MAX_ATTEMPTS)
+        raise
+    finally:
+        if not retrying:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    doc_ref = repositories.for_collection(uid, params['collection']).doc(params['doc_id'])
+    snap = doc_ref.get()
+    if not snap.exists:
+        return {'skipped': 'document deleted'}
+    current = snap.to_dict()
+    if any(current.get(field) != url for field, url in urls.items()):
+        doc_ref.update(urls)
+    if params['collection'] == 'drivers':
+        cache_service.invalidate(uid, 'drivers')
+    return urls
@@ -0,0 +1,76 @@
+import threading
+
+from flask import g, has_app_context, request
+from app.services import metrics
+
+# Request-scoped memo for Firestore reads. Reading the same document or
+# collection again within one request returns the snapshots already fetched
+# (held on flask.g and shared with concurrency.gather workers), and the number
+# of reads saved is logged when the request ends. Only use it for reads that
+# happen before the request writes to the same document.
+
+
+class _Memo:
+    def __init__(self):
+        self.values = {}
+        self.key_locks = {}
+        self.lock = threading.Lock()
+        self.saved = 0
+
+
+def current():
+    """The memo of the current request/app context (created on first use), or None."""
+    if not has_app_context():
+        return None
+    memo = g.get('_read_memo')
+    if memo is None:
+        memo = g._read_memo = _Memo()
+    return memo
+
+
+def adopt(memo):
+    # Share a parent context's memo with work running in a child app context
+    if memo is not None:
+        g._read_memo = memo
+
+
+def _memoized(key, load):
+    memo = current()
+    if memo is None:
+        return load()
+    with memo.lock:
+        key_lock = memo.key_locks.setdefault(key, threading.Lock())
+    # Concurrent reads of the same key wait for the first one instead of issuing their own
+    with key_lock:
+        with memo.lock:
+            if key in memo.values:
+                memo.saved += 1
+                metrics.record_cache('request_memo', True)
+                return memo.values[key]
+        metrics.record_cache('request_memo', False)
+        value = load()
+        with memo.lock:
+            memo.values[key] = value
+        return value
+
+
+def get_document(ref):
+    """DocumentSnapshot for ref, read at most once per request."""
+    return _memoized(('doc', ref.path), ref.get)
+
+
+def stream(query, key=None):
+    """List of DocumentSnapshots for a query, streamed at most once per request.
+
+    A collection reference is keyed by its path; other queries need an explicit key.
+    """
+    key = key or '/'.join(query._path)
+    return _memoized(('stream', key), lambda: list(query.stream()))
+
+
+def init_request_memo(app):
+    @app.teardown_request
+    def log_saved_reads(exc=None):
+        memo = g.get('_read_memo')
+        if memo is not None and memo.saved:
+            print(f"[read memo] {request.method} {request.path}: {memo.saved} duplicate Firestore read(s) saved")
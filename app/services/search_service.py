@@ -0,0 +1,172 @@
+import threading
+import time
+
+from flask import current_app
+from app import repositories
+from app.services import metrics
+
+# Per-org in-memory index over student name and roll number.
+# Built once from Firestore (projected to the few fields it needs), then kept
+# current by the student write endpoints. A periodic rebuild picks up writes
+# made by other gunicorn workers; one request rebuilds while the others wait
+# for it, and writes applied during a rebuild are replayed on top of it.
+INDEX_FIELDS = ['full_name', 'roll_number', 'bus_number', 'route_name']
+DEFAULT_TTL = 600  # seconds
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _ttl():
+    try:
+        return current_app.config.get('SEARCH_INDEX_TTL', DEFAULT_TTL)
+    except RuntimeError:
+        return DEFAULT_TTL
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class StudentIndex:
+    def __init__(self, uid):
+        self.uid = uid
+        self.entries = {}
+        self.grams = {}
+        self.lock = threading.Lock()
+        self.build_lock = threading.Lock()
+        self.expires_at = 0
+        self.pending = None  # writes applied while a build is reading: [(student_id, data or None)]
+
+    def build(self):
+        students_ref = repositories.students(self.uid).ref
+        with self.lock:
+            self.pending = []
+        try:
+            entries = {}
+            for doc in students_ref.select(INDEX_FIELDS).stream():
+                d = doc.to_dict()
+                entries[doc.id] = {f: d.get(f, '') or '' for f in INDEX_FIELDS}
+        except Exception:
+            with self.lock:
+                self.pending = None
+            raise
+        with self.lock:
+            pending, self.pending = self.pending, None
+            self.entries = {}
+            self.grams = {}
+            for student_id, entry in entries.items():
+                self._add(student_id, entry)
+            # The read may predate these writes, so apply them again
+            for student_id, data in pending:
+                if data is None:
+                    self._remove(student_id)
+                else:
+                    self._upsert(student_id, data)
+            self.expires_at = time.monotonic() + _ttl()
+
+    def ensure_fresh(self):
+        """Rebuild if expired; concurrent callers wait for one rebuild. True on a cache hit."""
+        if self.expires_at > time.monotonic():
+            return True
+        with self.build_lock:
+            if self.expires_at <= time.monotonic():
+                self.build()
+        return False
+
+    def _keys(self, entry):
+        return str(entry['full_name']).lower(), str(entry['roll_number']).lower()
+
+    def _add(self, student_id, entry):
+        entry = dict(entry, id=student_id)
+        self.entries[student_id] = entry
+        for key in self._keys(entry):
+            for g in trigrams(key):
+                self.grams.setdefault(g, set()).add(student_id)
+
+    def _remove(self, student_id):
+        entry = self.entries.pop(student_id, None)
+        if not entry:
+            return
+        for key in self._keys(entry):
+            for g in trigrams(key):
+                ids = self.grams.get(g)
+                if ids:
+                    ids.discard(student_id)
+                    if not ids:
+                        del self.grams[g]
+
+    def _upsert(self, student_id, data):
+        current = self.entries.get(student_id)
+        if current is None and not all(f in data for f in INDEX_FIELDS):
+            # A partial update of a student this index has not seen (written
+            # by another worker): leave it to the next rebuild rather than
+            # indexing blank fields
+            return
+        entry = dict(current or {})
+        for f in INDEX_FIELDS:
+            if f in data:
+                entry[f] = data[f] or ''
+        entry.pop('id', None)
+        self._remove(student_id)
+        self._add(student_id, entry)
+
+    def upsert(self, student_id, data):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((student_id, dict(data)))
+            self._upsert(student_id, data)
+
+    def remove(self, student_id):
+        with self.lock:
+            if self.pending is not None:
+                self.pending.append((student_id, None))
+            self._remove(student_id)
+
+    def search(self, q):
+        q = q.lower()
+        with self.lock:
+            if len(q) >= 3:
+                # Candidates must contain every trigram of the query
+                candidates = None
+                for g in sorted(trigrams(q), key=lambda g: len(self.grams.get(g, ()))):
+                    ids = self.grams.get(g)
+                    if not ids:
+                        return []
+                    candidates = set(ids) if candidates is None else candidates & ids
+                    if not candidates:
+                        return []
+                pool = [self.entries[i] for i in candidates]
+            else:
+                pool = list(self.entries.values())
+            # Same substring semantics as the students page search
+            return [dict(e) for e in pool
+                    if any(q in key for key in self._keys(e))]
+
+
+def get_index(uid):
+    with _lock:
+        index = _indexes.get(uid)
+        if index is None:
+            index = _indexes[uid] = StudentIndex(uid)
+    metrics.record_cache('search_index', index.ensure_fresh())
+    return index
+
+
+def search(uid, q, limit=None):
+    """Return index entries (id, full_name, roll_number, bus_number, route_name) matching q, sorted by ID."""
+    results = sorted(get_index(uid).search(q), key=lambda e: e['id'])
+    return results[:limit] if limit else results
+
+
+def upsert_student(uid, student_id, data):
+    """Apply a student write to an already-built index (no-op otherwise)."""
+    index = _indexes.get(uid)
+    if index is not None:
+        index.upsert(student_id, data)
+
+
+def remove_student(uid, student_id):
+    index = _indexes.get(uid)
+    if index is not None:
+        index.remove(student_id)
@@ -0,0 +1,224 @@
+from firebase_admin import firestore
+from app.services.firebase_service import get_db, count_documents
+from app import repositories
+from app.services import cache_service, job_service
+
+# Seat bookkeeping for bus assignment. Every student write that moves a seat
+# runs in one Firestore transaction together with the bus update(s), so
+# concurrent enrollments cannot oversell a bus or lose a decrement.
+
+
+class SeatAllocationError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _buses_ref(uid):
+    return repositories.buses(uid).ref
+
+
+def _avail_seats(bus_data):
+    try:
+        return int(bus_data.get('avail_seats', 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def create_student(uid, student_ref, student_data, bus_number=''):
+    """Create a student and, if bus_number is given, reserve a seat on that bus.
+
+    Returns the stored student data (with bus and route fields filled in).
+    """
+    buses_ref = _buses_ref(uid)
+
+    @firestore.transactional
+    def run(transaction):
+        if student_ref.get(transaction=transaction).exists:
+            raise SeatAllocationError('Student already exists')
+
+        data = dict(student_data)
+        if bus_number:
+            query = buses_ref.where('bus_number', '==', bus_number).limit(1)
+            bus_docs = list(transaction.get(query))
+            if not bus_docs:
+                raise SeatAllocationError(f'Bus {bus_number} not found!')
+            bus_doc = bus_docs[0]
+            b_data = bus_doc.to_dict()
+            if _avail_seats(b_data) <= 0:
+                raise SeatAllocationError(f'Bus {bus_number} is full!')
+
+            transaction.update(bus_doc.reference, {'avail_seats': firestore.Increment(-1)})
+            data['bus_id'] = bus_doc.id
+            data['bus_number'] = bus_number
+            # Bus usually stores route name in 'route'
+            data['route_name'] = b_data.get('route', '')
+            data['route_id'] = b_data.get('route_id', '')
+
+        transaction.set(student_ref, data)
+        return data
+
+    return run(get_db().transaction())
+
+
+def update_student(uid, student_ref, updates):
+    """Apply updates to a student, moving its seat if 'bus_id' changes.
+
+    Returns the updates actually written (bus/route fields synced from the new bus).
+    """
+    buses_ref = _buses_ref(uid)
+
+    @firestore.transactional
+    def run(transaction):
+        student_snap = student_ref.get(transaction=transaction)
+        if not student_snap.exists:
+            raise SeatAllocationError('Student not found', 404)
+
+        data = dict(updates)
+        new_bus_id = data.get('bus_id')
+        old_bus_id = student_snap.to_dict().get('bus_id')
+        if 'bus_id' not in data or new_bus_id == old_bus_id:
+            transaction.update(student_ref, data)
+            return data
+
+        # All reads must happen before the first write
+        new_bus_ref = buses_ref.document(new_bus_id) if new_bus_id else None
+        old_bus_ref = buses_ref.document(old_bus_id) if old_bus_id else None
+        new_bus_snap = new_bus_ref.get(transaction=transaction) if new_bus_ref else None
+        old_bus_snap = old_bus_ref.get(transaction=transaction) if old_bus_ref else None
+
+        if new_bus_ref:
+            if not new_bus_snap.exists:
+                raise SeatAllocationError('Selected bus not found', 404)
+            bus_new_data = new_bus_snap.to_dict()
+            if _avail_seats(bus_new_data) <= 0:
+                raise SeatAllocationError('Selected bus is full (0 seats available).')
+
+            transaction.update(new_bus_ref, {'avail_seats': firestore.Increment(-1)})
+            # Update Route info as well from the new bus
+            data['route_name'] = bus_new_data.get('route', '')
+            data['route_id'] = bus_new_data.get('route_id', '')
+            data['bus_number'] = bus_new_data.get('bus_number', '')
+
+        if old_bus_snap is not None and old_bus_snap.exists:
+            transaction.update(old_bus_ref, {'avail_seats': firestore.Increment(1)})
+
+        transaction.update(student_ref, data)
+        return data
+
+    return run(get_db().transaction())
+
+
+def delete_student(uid, student_ref):
+    """Delete a student and release its seat. Returns the deleted data, or None."""
+    buses_ref = _buses_ref(uid)
+
+    @firestore.transactional
+    def run(transaction):
+        student_snap = student_ref.get(transaction=transaction)
+        if not student_snap.exists:
+            transaction.delete(student_ref)
+            return None
+
+        student_data = student_snap.to_dict()
+        bus_id = student_data.get('bus_id')
+        if bus_id:
+            bus_ref = buses_ref.document(bus_id)
+            if bus_ref.get(transaction=transaction).exists:
+                transaction.update(bus_ref, {'avail_seats': firestore.Increment(1)})
+
+        transaction.delete(student_ref)
+        return student_data
+
+    return run(get_db().transaction())
+
+
+BACKFILL_PAGE_SIZE = 500
+
+
+def backfill_bus_numbers(uid):
+    """Give students stored without a bus_number an empty one; returns how many.
+
+    Firestore cannot query for a missing field, so such students would never
+    match the students page's 'unassigned' filter.
+    """
+    db = get_db()
+    students_ref = repositories.students(uid).ref
+    fixed = 0
+    cursor = None
+    while True:
+        query = students_ref.select(['bus_number']).order_by('__name__').limit(BACKFILL_PAGE_SIZE)
+        if cursor:
+            query = query.start_after({'__name__': cursor})
+        docs = list(query.stream())
+        if not docs:
+            return fixed
+        missing = [doc for doc in docs if 'bus_number' not in (doc.to_dict() or {})]
+        if missing:
+            batch = db.batch()
+            for doc in missing:
+                batch.update(doc.reference, {'bus_number': ''})
+            batch.commit()
+            fixed += len(missing)
+        cursor = docs[-1].id
+
+
+@job_service.register('seat_recount')
+def recount_seats(job):
+    """Background job: set every bus's avail_seats from its actual assigned students."""
+    uid = job.uid
+    buses = list(_buses_ref(uid).stream())
+    students_ref = repositories.students(uid).ref
+    job.update(total=len(buses), processed=0)
+
+    backfilled = backfill_bus_numbers(uid)
+
+    details = []
+    for i, bus in enumerate(buses, 1):
+        bus_data = bus.to_dict()
+        # Get Capacity (handle string/int/missing)
+        try:
+            capacity = int(bus_data.get('capacity', 0))
+        except (TypeError, ValueError):
+            capacity = 0
+
+        # Count current students assigned to this bus (server-side count query)
+        assigned = count_documents(students_ref.where('bus_id', '==', bus.id))
+        avail_seats = capacity - assigned
+        bus.reference.update({'avail_seats': avail_seats})
+        details.append(f"Bus {bus_data.get('bus_number')} ({bus.id}): Cap={capacity}, Alloc={assigned}, Avail={avail_seats}")
+        job.update(processed=i)
+
+    cache_service.invalidate(uid, 'buses')
+    if backfilled:
+        details.append(f"Set an empty bus number on {backfilled} students that had none")
+    return {'message': f'Updated {len(buses)} buses', 'details': details}
+
+
+def reserve_seats(uid, bus_number, count):
+    """Reserve up to count seats on a bus in one update.
+
+    Returns (bus_id, bus_data, granted); granted may be less than count when the bus fills up.
+    """
+    buses_ref = _buses_ref(uid)
+
+    @firestore.transactional
+    def run(transaction):
+        query = buses_ref.where('bus_number', '==', bus_number).limit(1)
+        bus_docs = list(transaction.get(query))
+        if not bus_docs:
+            raise SeatAllocationError(f'Bus {bus_number} not found!')
+        bus_doc = bus_docs[0]
+        b_data = bus_doc.to_dict()
+        granted = max(0, min(count, _avail_seats(b_data)))
+        if granted:
+            transaction.update(bus_doc.reference, {'avail_seats': firestore.Increment(-granted)})
+        return bus_doc.id, b_data, granted
+
+    return run(get_db().transaction())
+
+
+def release_seats(uid, bus_id, count):
+    if count > 0:
+        _buses_ref(uid).document(bus_id).update({'avail_seats': firestore.Increment(count)})
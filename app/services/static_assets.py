@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+from flask import abort, send_from_directory, url_for
+
+# Build-free asset fingerprinting. At startup every file under app/static is
+# hashed and exposed as /assets/<name>.<hash>.<ext>; templates link to those
+# through asset_url(). A fingerprinted URL always has the same bytes, so it is
+# served with a one-year immutable Cache-Control and repeat page loads never
+# revalidate it. Editing a file changes its URL (rehashed on change in debug,
+# on restart otherwise).
+MAX_AGE = 31536000  # one year
+HASH_LENGTH = 12
+
+
+class AssetManifest:
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self.hashed = {}   # 'style.css' -> 'style.3f2a9c1b0d4e.css'
+        self.sources = {}  # 'style.3f2a9c1b0d4e.css' -> 'style.css'
+        self.mtimes = {}
+        self.build()
+
+    def _add(self, filename):
+        path = os.path.join(self.static_folder, filename)
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:HASH_LENGTH]
+        root, ext = os.path.splitext(filename)
+        hashed = f'{root}.{digest}{ext}'
+        old = self.hashed.get(filename)
+        if old:
+            self.sources.pop(old, None)
+        self.hashed[filename] = hashed
+        self.sources[hashed] = filename
+        self.mtimes[filename] = os.path.getmtime(path)
+
+    def build(self):
+        for dirpath, _, files in os.walk(self.static_folder):
+            for name in files:
+                rel = os.path.relpath(os.path.join(dirpath, name), self.static_folder)
+                self._add(rel.replace(os.sep, '/'))
+
+    def lookup(self, filename, watch=False):
+        if watch:
+            path = os.path.join(self.static_folder, filename)
+            if os.path.isfile(path) and os.path.getmtime(path) != self.mtimes.get(filename):
+                self._add(filename)
+        return self.hashed.get(filename)
+
+
+def init_assets(app):
+    manifest = AssetManifest(app.static_folder)
+    app.extensions['asset_manifest'] = manifest
+
+    def asset_url(filename):
+        hashed = manifest.lookup(filename, watch=app.debug)
+        if not hashed:
+            # Not a known static file: plain (revalidated) static URL
+            return url_for('static', filename=filename)
+        return url_for('static_asset', filename=hashed)
+
+    def static_asset(filename):
+        source = manifest.sources.get(filename)
+        if not source:
+            abort(404)
+        response = send_from_directory(app.static_folder, source, max_age=MAX_AGE)
+        response.headers['Cache-Control'] = f'public, max-age={MAX_AGE}, immutable'
+        return response
+
+    app.add_url_rule('/assets/<path:filename>', 'static_asset', static_asset)
+    app.jinja_env.globals['asset_url'] = asset_url
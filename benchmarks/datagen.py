@@ -0,0 +1,371 @@
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+# Synthetic organization generator for scale testing.
+#
+#   python -m benchmarks.datagen --out org.ndjson.gz                  # 20k students, 300 buses, 100 routes
+#   python -m benchmarks.datagen --out small.ndjson --students 500 --buses 10 --routes 4 --days 20
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python -m benchmarks.datagen --emulator --uid demo-org
+#   FIRESTORE_EMULATOR_HOST=localhost:8080 python -m benchmarks.datagen --load org.ndjson.gz --uid demo-org
+#
+# Documents use the fields the route modules and templates read: students
+# with bus/route/fee fields, routes with a stops list, buses and drivers,
+# trip_history under every bus and driver (a 'scans' list of cardId/scanType
+# entries), and per student 'payments', 'attendance_record' (one per trip)
+# and 'attendance' (one per day, morning_status/evening_status). Trips run on
+# weekdays only, over the --days before --end-date; on the last day half of
+# the buses are still on their morning trip.
+#
+# Every entity draws from its own random stream keyed by (seed, kind, index),
+# so the same arguments always produce the same documents, and changing one
+# size (say --days) leaves the other entities as they were. Paths are
+# relative to the organization document ('' is the org itself), so a fixture
+# can be loaded under any organization ID.
+END_DATE = date(2025, 10, 31)
+
+FIRST_NAMES = ['Aarav', 'Diya', 'Ishaan', 'Ananya', 'Vihaan', 'Meera', 'Arjun', 'Saanvi', 'Kabir', 'Riya',
+               'Aditya', 'Nisha', 'Rohan', 'Kavya', 'Siddharth', 'Pooja', 'Rahul', 'Sneha', 'Karthik', 'Lakshmi',
+               'Nikhil', 'Anjali', 'Varun', 'Gayathri', 'Abhinav', 'Devika', 'Harish', 'Shreya', 'Manu', 'Fathima']
+LAST_NAMES = ['Sharma', 'Nair', 'Iyer', 'Reddy', 'Menon', 'Patel', 'Kumar', 'Das', 'Pillai', 'Rao',
+              'Singh', 'Joseph', 'Varma', 'Gupta', 'Thomas', 'Krishnan', 'Mathew', 'Hussain', 'Kurian', 'Bose']
+BATCHES = ['CS', 'EC', 'EE', 'ME', 'CE', 'AD']
+PAYMENT_MODES = ['Cash', 'UPI', 'Bank Transfer', 'Card']
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'O+', 'O-', 'AB+', 'AB-']
+MORNING_START = 7 * 60  # minutes after midnight
+EVENING_START = 16 * 60 + 15
+
+
+def _rng(seed, *key):
+    # Independent, reproducible stream per entity (string seeds are hashed with SHA-512)
+    return random.Random(':'.join(str(k) for k in (seed,) + key))
+
+
+def _name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def _phone(rng):
+    return '+91' + str(rng.randint(6000000000, 9999999999))
+
+
+def _at(day, minutes):
+    return datetime(day.year, day.month, day.day) + timedelta(minutes=minutes)
+
+
+def school_days(end_date, days):
+    """Weekdays among the `days` calendar days ending at end_date, oldest first."""
+    start = end_date - timedelta(days=days - 1)
+    return [d for d in (start + timedelta(n) for n in range(days)) if d.weekday() < 5]
+
+
+def _payments(rng, fee, end_date):
+    # This year's installments (0-3), plus an archived one from last year for about half the students
+    docs = []
+    paid = 0.0
+    for n in range(rng.choice([0, 1, 1, 2, 3])):
+        amount = round(fee / 3, 2) if n < 2 else round(fee - paid, 2)
+        if amount <= 0:
+            break
+        day = end_date - timedelta(days=rng.randint(0, 150))
+        docs.append({'amount': amount, 'date': day.isoformat(), 'mode': rng.choice(PAYMENT_MODES),
+                     'reference_id': f'TXN{rng.getrandbits(40):010X}', 'archived': False})
+        paid += amount
+    if rng.random() < 0.5:
+        day = end_date - timedelta(days=rng.randint(300, 420))
+        docs.append({'amount': fee, 'date': day.isoformat(), 'mode': rng.choice(PAYMENT_MODES),
+                     'reference_id': f'TXN{rng.getrandbits(40):010X}', 'archived': True})
+    return docs, round(paid, 2)
+
+
+def generate(students=20000, buses=300, routes=100, days=120, end_date=END_DATE, seed=0):
+    """Yield (path, data) for every document of one organization, path relative to the org."""
+    routes = max(1, routes)
+    yield '', {'name': f'Synthetic Org {seed}', 'email': f'admin{seed}@example.com', 'feeDetails': 'Monthly'}
+
+    # Stops and routes (stop fees rise along the route, which ends at the campus)
+    route_docs = []
+    for r in range(routes):
+        rng = _rng(seed, 'route', r)
+        stops = []
+        for s in range(rng.randint(4, 12)):
+            stop_id = f'stop_{r:03d}_{s:02d}'
+            stop = {'stop_name': f'Stop {r + 1}-{s + 1}', 'lat': round(9.8 + rng.random() * 0.5, 6),
+                    'long': round(76.2 + rng.random() * 0.5, 6), 'fee': float(8000 + 1500 * s)}
+            yield f'stops/{stop_id}', stop
+            stops.append({'id': stop_id, 'name': stop['stop_name'], 'fee': stop['fee']})
+        route_docs.append((f'route_{r:03d}', {
+            'route_name': f'Route {r + 1}', 'start_point': stops[0]['name'], 'end_point': 'Campus',
+            'distance': rng.randint(8, 45), 'stops': stops, 'assigned_bus': ''
+        }))
+
+    # Buses and their drivers, assigned round-robin to routes
+    bus_docs = []
+    for b in range(buses):
+        rng = _rng(seed, 'bus', b)
+        bus_id, driver_id = f'bus_{b:03d}', f'driver_{b:03d}'
+        route_id, route = route_docs[b % routes]
+        if not route['assigned_bus']:
+            route['assigned_bus'] = bus_id
+        driver_name = _name(rng)
+        yield f'drivers/{driver_id}', {
+            'full_name': driver_name, 'license_number': f'KL{rng.randint(1, 99):02d}{rng.randint(10**9, 10**10 - 1)}',
+            'phone_number': _phone(rng), 'assigned_bus': bus_id, 'driver_uid': driver_id,
+            'date_of_birth': f'{rng.randint(1965, 1995)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'joining_date': f'{rng.randint(2010, 2024)}-{rng.randint(1, 12):02d}-01',
+            'license_expiry_date': f'{rng.randint(2026, 2035)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'emergency_contact_name': _name(rng), 'emergency_contact_phone': _phone(rng),
+            'blood_group': rng.choice(BLOOD_GROUPS), 'address': f'{rng.randint(1, 400)} Temple Road',
+            'can_add_stop': rng.random() < 0.2
+        }
+        bus_docs.append((bus_id, {
+            'bus_number': f'BUS-{b + 1:03d}', 'registration_no': f'KL-{rng.randint(1, 60):02d}-{rng.randint(1000, 9999)}',
+            'capacity': rng.choice([40, 50, 60]), 'route_id': route_id, 'route': route['route_name'],
+            'driver_id': driver_id, 'driver_name': driver_name, 'status': 'active',
+            'trip_status': 'Not Started', 'on_board_count': 0
+        }, route))
+
+    for route_id, route in route_docs:
+        yield f'routes/{route_id}', route
+
+    # Students (spread over the buses) with their payments
+    riders = [[] for _ in bus_docs]  # per bus: (student_id, stop_index, attendance rate)
+    for i in range(students):
+        rng = _rng(seed, 'student', i)
+        batch = BATCHES[i % len(BATCHES)]
+        roll_number = f'VML{22 + i % 4}{batch}{i:05d}'
+        if bus_docs:
+            b = i % len(bus_docs)
+            bus_id, bus, route = bus_docs[b]
+        else:
+            b, bus_id, bus, route = None, '', {}, route_docs[i % routes][1]
+        stop_index = rng.randrange(len(route['stops']))
+        stop = route['stops'][stop_index]
+        fee = stop['fee']
+        payments, paid = _payments(rng, fee, end_date)
+        yield f'students/{roll_number}', {
+            'full_name': _name(rng), 'roll_number': roll_number, 'auth_uid': roll_number,
+            'rfid_tag_id': f'RF{rng.getrandbits(32):08X}',
+            'parent_name': _name(rng), 'parent_phone': _phone(rng), 'student_phone': _phone(rng),
+            'email': f'{roll_number.lower()}@example.com',
+            'dob': f'{rng.randint(2002, 2007)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'address': f'{rng.randint(1, 400)} Main Road', 'batch': batch,
+            'bus_id': bus_id, 'bus_number': bus.get('bus_number', ''),
+            'route_id': bus.get('route_id', ''), 'route_name': route['route_name'],
+            'bus_stop': stop['name'], 'payment_type': 'Monthly',
+            'fee_amount': fee, 'paid': paid, 'due': round(fee - paid, 2),
+            'fee_status': 'Paid' if paid >= fee else 'Pending', 'can_travel': paid >= fee,
+            'created_at': _at(end_date - timedelta(days=rng.randint(days, days + 365)), rng.randint(540, 1020))
+        }
+        for n, payment in enumerate(payments):
+            yield f'students/{roll_number}/payments/pay_{n:02d}', payment
+        if b is not None:
+            riders[b].append((roll_number, stop_index, rng.uniform(0.7, 0.98)))
+
+    # Trips per bus and school day, with the matching per-student attendance
+    calendar = school_days(end_date, days)
+    for b, (bus_id, bus, route) in enumerate(bus_docs):
+        last_trip = None
+        for day in calendar:
+            rng = _rng(seed, 'trips', b, day.isoformat())
+            live = day == calendar[-1] and b % 2 == 0
+            morning = {sid for sid, _, rate in riders[b] if rng.random() < rate}
+            evening = set() if live else {sid for sid, _, _ in riders[b]
+                                          if rng.random() < (0.95 if sid in morning else 0.05)}
+            statuses = {}
+            for trip_type, start, boarded in (('morning', MORNING_START, morning), ('evening', EVENING_START, evening)):
+                if live and trip_type == 'evening':
+                    break
+                trip, records = _trip(rng, day, trip_type, start, bus, route, riders[b], boarded, live)
+                trip_id = f'{day.isoformat()}_{trip_type}'
+                yield f'buses/{bus_id}/trip_history/{trip_id}', trip
+                yield f'drivers/{bus["driver_id"]}/trip_history/{trip_id}', trip
+                for sid, record in records.items():
+                    yield f'students/{sid}/attendance_record/{trip_id}', record
+                    statuses.setdefault(sid, {})[trip_type] = record
+                last_trip = trip
+            for sid, _, _ in riders[b]:
+                yield f'students/{sid}/attendance/{day.isoformat()}', _daily(day, statuses.get(sid, {}))
+
+        if last_trip and last_trip['status'] == 'started':
+            bus['trip_status'] = 'Started'
+            bus['on_board_count'] = last_trip['boardedStudents']
+        elif last_trip:
+            bus['trip_status'] = 'Completed'
+        bus['capacity'] = max(bus['capacity'], len(riders[b]))
+        bus['avail_seats'] = bus['capacity'] - len(riders[b])
+        yield f'buses/{bus_id}', bus
+
+
+def _trip(rng, day, trip_type, start, bus, route, riders, boarded, live):
+    # Morning: picked up along the route, dropped at campus. Evening: the reverse.
+    n_stops = len(route['stops'])
+    duration = 20 + 4 * n_stops + rng.randint(0, 15)
+    scans, records = [], {}
+    for sid, stop_index, _ in riders:
+        if sid not in boarded:
+            continue
+        if trip_type == 'morning':
+            boarded_at = _at(day, start + 4 * stop_index + rng.randint(0, 3))
+            dropped_at = _at(day, start + duration)
+        else:
+            boarded_at = _at(day, start + rng.randint(0, 5))
+            dropped_at = _at(day, start + 10 + 4 * (n_stops - 1 - stop_index) + rng.randint(0, 3))
+        if live:
+            dropped_at = None
+        stop_name = route['stops'][stop_index]['name']
+        scans.append({'cardId': sid, 'scanType': 'entry', 'timestamp': boarded_at.isoformat()})
+        if dropped_at:
+            scans.append({'cardId': sid, 'scanType': 'exit', 'timestamp': dropped_at.isoformat()})
+        records[sid] = {
+            'date': day.isoformat(), 'bus_id': bus['bus_number'], 'trip_type': trip_type,
+            'start_point': stop_name if trip_type == 'morning' else 'Campus',
+            'end_point': 'Campus' if trip_type == 'morning' else stop_name,
+            'boarded_time': boarded_at, 'dropped_time': dropped_at,
+            'status': 'BOARDED' if live else 'DROPPED', 'timestamp': boarded_at
+        }
+    scans.sort(key=lambda scan: scan['timestamp'])  # devices append scans as they happen
+    started = _at(day, start)
+    return {
+        'date': day.isoformat(), 'busNumber': bus['bus_number'], 'driverId': bus['driver_id'],
+        'type': trip_type, 'status': 'started' if live else 'completed',
+        'startTime': started.isoformat(),
+        'endTime': None if live else _at(day, start + duration).isoformat(),
+        'durationMinutes': 0 if live else duration,
+        'boardedStudents': len(records), 'totalStudents': len(riders),
+        'scans': scans, 'timestamp': started
+    }, records
+
+
+def _daily(day, trips):
+    doc = {'date': day.isoformat()}
+    for trip_type in ('morning', 'evening'):
+        record = trips.get(trip_type)
+        if record is None:
+            doc[f'{trip_type}_status'] = 'Absent'
+            continue
+        doc[f'{trip_type}_status'] = 'exited' if record['dropped_time'] else 'Present'
+        doc[f'{trip_type}_time'] = record['boarded_time'].strftime('%H:%M')
+        if record['dropped_time']:
+            doc[f'{trip_type}_exit_time'] = record['dropped_time'].strftime('%H:%M')
+    return doc
+
+
+# ---------------------------------------------------------------- sinks
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__timestamp__': value.isoformat()}
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _decode(obj):
+    if len(obj) == 1 and '__timestamp__' in obj:
+        return datetime.fromisoformat(obj['__timestamp__'])
+    return obj
+
+
+def _open(path, mode):
+    return gzip.open(path, mode + 't', encoding='utf-8') if path.endswith('.gz') else open(path, mode, encoding='utf-8')
+
+
+class NdjsonSink:
+    """One {"path", "data"} object per line; timestamps as {"__timestamp__": iso}. Gzipped for *.gz."""
+
+    def __init__(self, path):
+        self.file = _open(path, 'w')
+
+    def write(self, path, data):
+        self.file.write(json.dumps({'path': path, 'data': data}, default=_encode, separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class FirestoreSink:
+    """Writes under organizations/{uid} with a BulkWriter (Firestore/emulator or the in-memory client)."""
+
+    def __init__(self, uid):
+        from app import repositories
+        from app.services.firebase_service import get_db
+        self.org_ref = repositories.org_ref(uid)
+        self.writer = get_db().bulk_writer()
+
+    def write(self, path, data):
+        ref = self.org_ref
+        parts = path.split('/') if path else []
+        for i in range(0, len(parts), 2):
+            ref = ref.collection(parts[i]).document(parts[i + 1])
+        self.writer.set(ref, data)
+
+    def close(self):
+        self.writer.close()
+
+
+def read_fixture(path):
+    """Yield (path, data) from an NDJSON fixture written by NdjsonSink."""
+    with _open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                doc = json.loads(line, object_hook=_decode)
+                yield doc['path'], doc['data']
+
+
+def write(docs, sink, progress_every=100000):
+    """Drain a (path, data) iterable into a sink; returns the number of documents written."""
+    count = 0
+    started = time.perf_counter()
+    try:
+        for path, data in docs:
+            sink.write(path, data)
+            count += 1
+            if progress_every and count % progress_every == 0:
+                print(f"  {count} documents ({count / (time.perf_counter() - started):.0f}/s)", file=sys.stderr)
+    finally:
+        sink.close()
+    return count
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic organization (deterministic under --seed).')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--out', help='write an NDJSON fixture (gzipped if the name ends in .gz)')
+    target.add_argument('--emulator', action='store_true', help='bulk-write to the Firestore emulator')
+    target.add_argument('--load', metavar='FIXTURE', help='bulk-write an existing fixture to the emulator')
+    parser.add_argument('--uid', default='synthetic-org', help='organization ID for --emulator/--load')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--students', type=int, default=20000)
+    parser.add_argument('--buses', type=int, default=300)
+    parser.add_argument('--routes', type=int, default=100)
+    parser.add_argument('--days', type=int, default=120, help='calendar days of trips/attendance (weekdays only)')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=END_DATE, help='last day with trips (YYYY-MM-DD)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    docs = read_fixture(args.load) if args.load else generate(
+        students=args.students, buses=args.buses, routes=args.routes,
+        days=args.days, end_date=args.end_date, seed=args.seed)
+
+    if args.out:
+        count = write(docs, NdjsonSink(args.out))
+        print(f"Wrote {count} documents to {args.out}")
+        return
+
+    if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        sys.exit('Refusing to write to a real Firestore project: set FIRESTORE_EMULATOR_HOST')
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        count = write(docs, FirestoreSink(args.uid))
+    print(f"Wrote {count} documents to organizations/{args.uid}")
+
+
+if __name__ == '__main__':
+    main()
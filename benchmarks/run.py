@@ -0,0 +1,281 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Load test for the admin pages and APIs.
+#
+#   python -m benchmarks.run                       # in-process, DATA_BACKEND=memory
+#   python -m benchmarks.run --students 5000 --concurrency 8 --json after.json --compare before.json
+#   python -m benchmarks.run --backend firestore   # against the Firestore emulator (FIRESTORE_EMULATOR_HOST)
+#   python -m benchmarks.run --backend firestore --url http://127.0.0.1:8000   # a running gunicorn, same emulator
+#
+# A synthetic org is seeded (benchmarks/datagen.py, deterministic under
+# --seed) or loaded from a --fixture, then every scenario is requested
+# --warmup times and measured over --requests requests. Latency is wall time
+# until the full body is read; backend calls and documents read come from the
+# Server-Timing header that app.services.instrumentation adds (no header:
+# nothing was read; streamed responses such as exports are not counted).
+# Keep the sizes, seed and backend fixed to compare commits.
+SCENARIOS = [
+    ('dashboard', '/'),
+    ('students', '/students'),
+    ('student_search', '/api/students/search?q={student}'),
+    ('student_details', '/student_details/{student}'),
+    ('student_attendance', '/student_details/{student}/attendance'),
+    ('buses', '/buses'),
+    ('bus_details', '/bus/{bus}'),
+    ('bus_history', '/bus/{bus}/history'),
+    ('drivers', '/drivers'),
+    ('driver_details', '/driver/{driver}'),
+    ('routes', '/routes'),
+    ('route_details', '/route/{route}'),
+    ('stops', '/stops'),
+    ('live_trips', '/api/live_trips'),
+    ('export_students', '/api/export/students?format=csv'),
+]
+# Streamed responses go out before the backend calls finish, so they carry no Server-Timing
+STREAMED = {'export_students'}
+
+SERVER_TIMING = re.compile(r'(\w+);dur=[\d.]+;desc="(\d+) calls, (\d+) docs"')
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    # Smallest value with at least p% of the samples at or below it
+    return sorted_values[max(1, math.ceil(p / 100 * len(sorted_values))) - 1]
+
+
+def backend_counts(header):
+    """{'firestore': (calls, docs), ...} from a Server-Timing header value."""
+    return {service: (int(calls), int(docs)) for service, calls, docs in SERVER_TIMING.findall(header or '')}
+
+
+class InProcessClient:
+    """Flask test client with a logged-in session (one per thread)."""
+
+    def __init__(self, app, uid):
+        self.app = app
+        self.uid = uid
+        self.local = threading.local()
+
+    def _client(self):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+            with client.session_transaction() as sess:
+                sess['user'] = f'{self.uid}@example.com'
+                sess['uid'] = self.uid
+        return client
+
+    def get(self, path):
+        response = self._client().get(path)
+        body = response.get_data()  # drains streamed responses too
+        return response.status_code, response.headers.get('Server-Timing'), len(body)
+
+
+class HttpClient:
+    """urllib client for a running server; the session cookie is signed with this app's SECRET_KEY."""
+
+    def __init__(self, app, uid, base_url):
+        self.base_url = base_url.rstrip('/')
+        serializer = app.session_interface.get_signing_serializer(app)
+        cookie = serializer.dumps({'user': f'{uid}@example.com', 'uid': uid})
+        self.cookie = f"{app.config['SESSION_COOKIE_NAME']}={cookie}"
+
+    def get(self, path):
+        req = urllib.request.Request(self.base_url + path, headers={'Cookie': self.cookie})
+        try:
+            with urllib.request.urlopen(req, timeout=120) as response:
+                body = response.read()
+                return response.status, response.headers.get('Server-Timing'), len(body)
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers.get('Server-Timing'), len(e.read())
+
+
+def run_scenario(client, warmup_paths, paths, concurrency, streamed=False):
+    """Request warmup_paths unmeasured, then every path once; returns the scenario's result dict."""
+    for path in warmup_paths:
+        client.get(path)
+
+    def one(path):
+        start = time.perf_counter()
+        status, timing, size = client.get(path)
+        return time.perf_counter() - start, status, timing, size
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, paths))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(s[0] for s in samples)
+    errors = sum(1 for s in samples if s[1] >= 400)
+    fs = [] if streamed else [backend_counts(s[2]).get('firestore', (0, 0)) for s in samples]
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'rps': len(samples) / wall if wall else 0.0,
+        'bytes': sum(s[3] for s in samples) // len(samples),
+        'firestore_calls': sum(c for c, _ in fs) / len(fs) if fs else None,
+        'firestore_docs': sum(d for _, d in fs) / len(fs) if fs else None,
+    }
+
+
+PLACEHOLDERS = {'student': 'students', 'bus': 'buses', 'driver': 'drivers', 'route': 'routes', 'stop': 'stops'}
+
+
+def scenario_paths(template, ids, count):
+    # Cycle through the seeded IDs so repeated requests hit different documents
+    paths = []
+    for i in range(count):
+        values = {name: ids[kind][i % len(ids[kind])] for name, kind in PLACEHOLDERS.items() if ids.get(kind)}
+        paths.append(template.format(**values))
+    return paths
+
+
+def existing_ids(uid, limit=100):
+    from app import repositories
+    return {kind: [doc.id for doc in repositories.for_collection(uid, kind).ref.limit(limit).stream()]
+            for kind in ('students', 'buses', 'drivers', 'routes', 'stops')}
+
+
+def git_revision():
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _fmt(value, spec):
+    return '-' if value is None else format(value, spec)
+
+
+def print_table(results):
+    print(f"{'scenario':<20} {'n':>4} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} "
+          f"{'fs calls':>8} {'fs docs':>8}")
+    for name, r in results.items():
+        print(f"{name:<20} {r['requests']:>4} {r['errors']:>4} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['rps']:>8.1f} {_fmt(r['firestore_calls'], '>8.1f')} "
+              f"{_fmt(r['firestore_docs'], '>8.1f')}")
+
+
+def print_comparison(results, baseline):
+    print(f"\nvs {baseline['meta']['revision']} ({baseline['meta']['timestamp']}):")
+    print(f"{'scenario':<20} {'p50 ms':>16} {'p95 ms':>16} {'fs docs':>16}")
+    for name, r in results.items():
+        b = baseline['results'].get(name)
+        if not b:
+            continue
+        cells = []
+        for key in ('p50_ms', 'p95_ms', 'firestore_docs'):
+            if r[key] is None or b[key] is None:
+                cells.append(f"{'-':>16}")
+                continue
+            change = (r[key] - b[key]) / b[key] * 100 if b[key] else 0.0
+            cells.append(f"{b[key]:>7.1f} {change:>+7.1f}%")
+        print(f"{name:<20} " + ' '.join(cells))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the admin pages and APIs against a synthetic org.')
+    parser.add_argument('--backend', choices=['memory', 'firestore'], default='memory',
+                        help='memory: in-process fake (default); firestore: needs FIRESTORE_EMULATOR_HOST to seed')
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process test client')
+    parser.add_argument('--uid', default='bench-org', help='organization ID to seed and log in as')
+    parser.add_argument('--no-seed', action='store_true', help='use the data already stored under --uid')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--buses', type=int, default=20)
+    parser.add_argument('--routes', type=int, default=8)
+    parser.add_argument('--days', type=int, default=10, help='calendar days of trip history and attendance')
+    parser.add_argument('--fixture', help='seed from an NDJSON fixture written by benchmarks.datagen instead')
+    parser.add_argument('--requests', type=int, default=30, help='measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='unmeasured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--cold', action='store_true',
+                        help='in-process only: disable the reference cache and search index TTLs')
+    parser.add_argument('--only', help='comma-separated scenario names')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='baseline results file from an earlier --json run')
+    parser.add_argument('--verbose', action='store_true', help='keep the per-request app logs')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ['DATA_BACKEND'] = args.backend
+    if args.backend == 'firestore' and not args.no_seed and not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        sys.exit('Refusing to seed a real Firestore project: set FIRESTORE_EMULATOR_HOST or pass --no-seed')
+    if args.url and args.backend == 'memory':
+        sys.exit('--url needs a shared store: run the server and this script against the Firestore emulator')
+
+    # Config reads the environment at import time, so the app is imported only now
+    from app import create_app
+    from benchmarks import datagen
+    app = create_app()
+    if args.cold:
+        app.config['REFERENCE_CACHE_TTL'] = 0
+        app.config['SEARCH_INDEX_TTL'] = 0
+
+    with app.app_context():
+        if not args.no_seed:
+            docs = datagen.read_fixture(args.fixture) if args.fixture else datagen.generate(
+                students=args.students, buses=args.buses, routes=args.routes, days=args.days, seed=args.seed)
+            count = datagen.write(docs, datagen.FirestoreSink(args.uid))
+            print(f"Seeded organizations/{args.uid} ({count} documents)")
+        ids = existing_ids(args.uid)
+
+    client = HttpClient(app, args.uid, args.url) if args.url else InProcessClient(app, args.uid)
+    only = set(args.only.split(',')) if args.only else None
+    scenarios = [(name, path) for name, path in SCENARIOS if not only or name in only]
+
+    results = {}
+    for name, template in scenarios:
+        paths = scenario_paths(template, ids, args.warmup + args.requests)
+        log = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with log:
+            results[name] = run_scenario(client, paths[:args.warmup], paths[args.warmup:], args.concurrency,
+                                         streamed=name in STREAMED)
+
+    print_table(results)
+
+    meta = {
+        'revision': git_revision(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'target': args.url or 'in-process',
+        'args': {k: v for k, v in vars(args).items() if k not in ('json', 'compare', 'verbose')},
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(results, json.load(f))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'meta': meta, 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,3 +7,23 @@ class Config:
     # Prefer env var for credentials, fallback to file
     FIREBASE_CREDENTIALS = os.environ.get('FIREBASE_CREDENTIALS_JSON') or "serviceAccountKey.json"
     FIREBASE_RTDB_URL = "https://bus-management-c8612-default-rtdb.firebaseio.com/"
+    # Seconds to keep per-org buses/routes/drivers/stops in memory
+    REFERENCE_CACHE_TTL = int(os.environ.get('REFERENCE_CACHE_TTL', 60))
+    # Seconds before the in-memory student search index is rebuilt from Firestore
+    SEARCH_INDEX_TTL = int(os.environ.get('SEARCH_INDEX_TTL', 600))
+    # Thread pool size for parallel Firestore reads inside page handlers
+    FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', 16))
+    # Separate pool for the parallel reads of background jobs and exports
+    BACKGROUND_FANOUT_WORKERS = int(os.environ.get('BACKGROUND_FANOUT_WORKERS', 8))
+    # Worker threads per process for background admin jobs
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    # Re-queue stale queued/retrying jobs at startup
+    JOB_RECOVERY = os.environ.get('JOB_RECOVERY', '1') != '0'
+    # Responses smaller than this many bytes are sent uncompressed
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    # Live-trip SSE streams per process (each holds a gthread thread); extra tabs poll
+    LIVE_STREAM_LIMIT = int(os.environ.get('LIVE_STREAM_LIMIT', 4))
+    # Bearer token required to scrape /metrics (open if unset)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # 'firestore', or 'memory' to run against an in-memory Firestore stand-in (offline load tests)
+    DATA_BACKEND = os.environ.get('DATA_BACKEND', 'firestore')
@@ -0,0 +1,20 @@
+import os
+import shutil
+
+# Picked up automatically by `gunicorn run:app` (see Procfile).
+# With PROMETHEUS_MULTIPROC_DIR set, each worker writes its metrics to that
+# directory and /metrics aggregates them; stale files from a previous run are
+# cleared at startup and a dead worker's live gauges are dropped.
+
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)